@@ -0,0 +1,42 @@
+"""Scenarios per second of Assumptions.evaluate against evaluate_batch.
+Run from the repository root: python -m benchmarks.bench_evaluate"""
+import time
+import numpy as np
+from stock_valuation import Assumptions, evaluate_batch
+
+
+def random_scenarios(n, seed=0):
+    """Grid of random assumptions, revenues and share counts (one row per scenario)"""
+    rng = np.random.default_rng(seed)
+    return (rng.integers(1, 21, n),
+            rng.uniform(-5, 25, n),
+            rng.uniform(2, 30, n),
+            rng.uniform(2, 30, n),
+            rng.uniform(8, 40, n),
+            rng.uniform(8, 40, n),
+            rng.uniform(6, 15, n),
+            rng.uniform(1e8, 1e11, n),
+            rng.uniform(1e7, 1e10, n))
+
+
+def time_scalar(scenarios):
+    start = time.perf_counter()
+    for row in zip(*scenarios):
+        Assumptions(*row[:7]).evaluate(row[7], row[8])
+    return time.perf_counter() - start
+
+
+def time_batch(scenarios):
+    start = time.perf_counter()
+    evaluate_batch(*scenarios)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    scalar_scenarios = random_scenarios(20000)
+    batch_scenarios = random_scenarios(1000000)
+    scalar_rate = len(scalar_scenarios[0]) / time_scalar(scalar_scenarios)
+    batch_rate = len(batch_scenarios[0]) / time_batch(batch_scenarios)
+    print("Scalar evaluate: {:>14,.0f} scenarios/s".format(scalar_rate))
+    print("evaluate_batch:  {:>14,.0f} scenarios/s".format(batch_rate))
+    print("Speed-up:        {:>14.1f} x".format(batch_rate / scalar_rate))
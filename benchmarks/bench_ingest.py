@@ -0,0 +1,92 @@
+"""Peak memory of holding a universe of decoded responses (fetch_many) against
+streaming it to compressed files with ingest.py and reading it back.
+Every case runs in its own process so its peak RSS can be measured.
+Run from the repository root: python -m benchmarks.bench_ingest [--tickers 5000]"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from bulk_fetch import fetch_many
+from ingest import ingest, iter_stocks, records_path
+from instrumentation import peak_rss_mb
+from screen import value_stock
+from stock_valuation import STATEMENTS, Assumptions
+from benchmarks.synthetic import SyntheticSource, ticker_symbols
+
+LOW = Assumptions(10, 5, 15, 12, 15, 15, 12)
+HIGH = Assumptions(10, 12, 22, 20, 22, 25, 9)
+ALL_STATEMENTS = ('INCOME_STATEMENT', 'BALANCE_SHEET', 'CASH_FLOW', 'OVERVIEW')
+
+
+def case_baseline(n_tickers, directory):
+    """Interpreter, imports and the synthetic source alone"""
+    SyntheticSource()
+
+
+def case_fetch_many(n_tickers, directory):
+    """Before: every decoded response, balance sheets included, held until valued"""
+    stocks = fetch_many(ticker_symbols(n_tickers), 'synthetic', source=SyntheticSource(), cache=None,
+                        functions=ALL_STATEMENTS)
+    for stock in stocks.values():
+        value_stock(stock, LOW, HIGH)
+
+
+def case_ingest(n_tickers, directory):
+    """Stream the responses to the compressed files"""
+    for ticker, result in ingest(ticker_symbols(n_tickers), 'synthetic', directory, source=SyntheticSource()):
+        if isinstance(result, Exception):
+            raise result
+
+
+def case_load_all(n_tickers, directory):
+    """Read every ingested ticker back (needed fields only) and hold them all"""
+    stocks = list(iter_stocks(directory))
+    for stock in stocks:
+        value_stock(stock, LOW, HIGH)
+
+
+def case_stream(n_tickers, directory):
+    """Value the ingested tickers one at a time"""
+    for stock in iter_stocks(directory):
+        value_stock(stock, LOW, HIGH)
+
+
+CASES = {'baseline': case_baseline, 'fetch_many': case_fetch_many, 'ingest': case_ingest,
+         'load_all': case_load_all, 'stream': case_stream}
+
+
+def run_case_in_process(name: str, n_tickers: int, directory: str) -> dict:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_ingest', '--run-case', name,
+                             '--tickers', str(n_tickers), '--directory', directory],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak memory of bulk ingestion.")
+    parser.add_argument('--tickers', type=int, default=5000)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        start = time.perf_counter()
+        CASES[args.run_case](args.tickers, args.directory)
+        print(json.dumps({'seconds': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()}))
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        print("{:<12}{:>12}{:>12}".format("Case", "Time [s]", "RSS [MB]"))
+        for name in CASES:
+            result = run_case_in_process(name, args.tickers, directory)
+            print("{:<12}{:>12.2f}{:>12.1f}".format(name, result['seconds'], result['peak_rss_mb'] or float('nan')))
+        size = sum(os.path.getsize(records_path(directory, function)) for function in STATEMENTS)
+        print("{:,} tickers in {:.1f} MB of compressed files".format(args.tickers, size / 1e6))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
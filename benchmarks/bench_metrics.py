@@ -0,0 +1,40 @@
+"""Historical metrics of a universe: per-ticker Python loops against compute_metrics.
+Run from the repository root: python -m benchmarks.bench_metrics"""
+import time
+import numpy as np
+from historical_metrics import compute_metrics
+
+N_TICKERS = 5000
+N_YEARS = 5
+
+
+def loop_metrics(revenue, net_income, free_cash_flow):
+    """The loops display_historic_data and calculate_margins used to run per ticker"""
+    for rev_list, profit_list, fcf_list in zip(revenue.tolist(), net_income.tolist(), free_cash_flow.tolist()):
+        cagr_rev = [(rev_list[0] / rev_list[j]) ** (1 / j) - 1 for j in range(1, len(rev_list))]
+        prft_margin = [profit_list[i] / rev_list[i] for i in range(len(rev_list))]
+        fcf_mrgn = [fcf_list[i] / rev_list[i] for i in range(len(rev_list))]
+        avg_profit_margin, avg_fcf_margin = [], []
+        sum_profit_margin = sum_fcf_margin = 0
+        for j in range(len(fcf_mrgn)):
+            sum_fcf_margin += fcf_mrgn[j]
+            avg_fcf_margin.append(sum_fcf_margin / (j + 1))
+            sum_profit_margin += prft_margin[j]
+            avg_profit_margin.append(sum_profit_margin / (j + 1))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    revenue = rng.uniform(1e8, 1e11, (N_TICKERS, N_YEARS))
+    net_income = revenue * rng.uniform(-0.05, 0.3, (N_TICKERS, N_YEARS))
+    operating_cash_flow = revenue * rng.uniform(0.05, 0.35, (N_TICKERS, N_YEARS))
+    capex = revenue * rng.uniform(0.01, 0.1, (N_TICKERS, N_YEARS))
+    start = time.perf_counter()
+    loop_metrics(revenue, net_income, operating_cash_flow - capex)
+    loop_time = time.perf_counter() - start
+    start = time.perf_counter()
+    compute_metrics(revenue, net_income, operating_cash_flow, capex)
+    array_time = time.perf_counter() - start
+    print("{} tickers x {} years".format(N_TICKERS, N_YEARS))
+    print("Python loops:    {:8.1f} ms".format(loop_time * 1000))
+    print("compute_metrics: {:8.1f} ms (including rolling means and growth stability)".format(array_time * 1000))
@@ -0,0 +1,21 @@
+"""Time of a Monte Carlo fair value distribution for one ticker.
+Run from the repository root: python -m benchmarks.bench_monte_carlo"""
+import time
+import numpy as np
+from monte_carlo import simulate
+from stock_valuation import Assumptions
+
+LOW = Assumptions(10, 5, 15, 12, 15, 15, 12)
+HIGH = Assumptions(10, 12, 22, 20, 22, 25, 9)
+CORRELATION = np.eye(6) + 0.5 * (np.eye(6, k=1) + np.eye(6, k=-1))
+
+
+if __name__ == "__main__":
+    for n_paths in (10 ** 5, 10 ** 6):
+        for correlation in (None, CORRELATION):
+            start = time.perf_counter()
+            result = simulate(LOW, HIGH, 5.7e10, 9e8, n_paths, seed=1, correlation=correlation)
+            elapsed = time.perf_counter() - start
+            print("{:>9,} paths, {:<12} {:7.3f} s   median FCF value {:.2f}".format(
+                n_paths, 'correlated' if correlation is not None else 'independent', elapsed,
+                result['fcf'][list(result['percentiles']).index(50)]))
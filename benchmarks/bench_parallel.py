@@ -0,0 +1,37 @@
+"""Scaling of parallel.value_universe with the number of worker processes on a
+10,000 ticker x 100 scenario job.
+Run from the repository root: python -m benchmarks.bench_parallel [tickers]"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from fundamentals_store import FundamentalsStore
+from parallel import value_universe
+from benchmarks.synthetic import iter_synthetic_stocks
+
+N_SCENARIOS = 100
+
+
+def random_scenarios(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(5, 16, n), rng.uniform(0, 20, n), rng.uniform(5, 25, n),
+                            rng.uniform(5, 25, n), rng.uniform(10, 30, n), rng.uniform(10, 30, n),
+                            rng.uniform(7, 14, n)])
+
+
+if __name__ == "__main__":
+    n_tickers = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    scenarios = random_scenarios(N_SCENARIOS)
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    with tempfile.TemporaryDirectory() as directory:
+        FundamentalsStore.from_stocks(iter_synthetic_stocks(n_tickers)).save(directory)
+        print("{} tickers x {} scenarios, {} cores".format(n_tickers, N_SCENARIOS, os.cpu_count()))
+        baseline = None
+        for n_workers in worker_counts:
+            start = time.perf_counter()
+            values, _ = value_universe(directory, scenarios, n_workers=n_workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print("{:>2} workers: {:7.3f} s  speed-up {:4.1f} x  ({:,.0f} valuations/s)".format(
+                n_workers, elapsed, baseline / elapsed, values.shape[0] * values.shape[1] / elapsed))
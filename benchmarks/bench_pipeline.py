@@ -0,0 +1,49 @@
+"""Throughput of the screening pipeline without network access or API quota.
+A synthetic universe is saved as fixtures and valued through ReplaySource
+(disk only) and through a local fixture server (HTTP round trips).
+Run from the repository root: python -m benchmarks.bench_pipeline"""
+import tempfile
+import time
+import numpy as np
+from bulk_fetch import TokenBucket
+from data_sources import AlphaVantageSource, ReplaySource, save_fixture, serve_fixtures
+from screen import screen
+from stock_valuation import Assumptions
+from benchmarks.synthetic import synthetic_payloads
+
+N_TICKERS = 500
+LOW = Assumptions(10, 5, 15, 12, 15, 15, 12)
+HIGH = Assumptions(10, 12, 22, 20, 22, 25, 9)
+
+
+def save_universe(directory: str, n_tickers: int) -> list:
+    rng = np.random.default_rng(0)
+    tickers = ['T{:05d}'.format(i) for i in range(n_tickers)]
+    for ticker in tickers:
+        for function, data in synthetic_payloads(ticker, rng).items():
+            save_fixture(directory, function, ticker, data)
+    return tickers
+
+
+def tickers_per_second(tickers, **fetch_options) -> float:
+    start = time.perf_counter()
+    rows = list(screen(tickers, 'replay', LOW, HIGH, cache=None, **fetch_options))
+    elapsed = time.perf_counter() - start
+    assert not any(row['error'] for row in rows)
+    return len(rows) / elapsed
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as directory:
+        tickers = save_universe(directory, N_TICKERS)
+        print("{} tickers".format(N_TICKERS))
+        print("ReplaySource:        {:8.0f} tickers/s".format(
+            tickers_per_second(tickers, source=ReplaySource(directory))))
+        server = serve_fixtures(directory)
+        try:
+            for workers in (1, 4, 8):
+                print("Fixture server, {} workers: {:8.0f} tickers/s".format(workers, tickers_per_second(
+                    tickers, source=AlphaVantageSource(server.url), max_workers=workers,
+                    limiter=TokenBucket(10 ** 9))))
+        finally:
+            server.shutdown()
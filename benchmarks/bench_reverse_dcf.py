@@ -0,0 +1,33 @@
+"""Time to solve the implied growth and rate of return of a whole universe
+with the batched reverse DCF solver, with its convergence diagnostics.
+Run from the repository root: python -m benchmarks.bench_reverse_dcf"""
+import time
+import numpy as np
+from reverse_dcf import implied_growth, implied_return
+from stock_valuation import Assumptions, evaluate_batch
+
+UNIVERSE_SIZES = (5000, 100000)
+ASSUMPTIONS = Assumptions(10, 8, 15, 12, 18, 20, 10)
+
+
+def random_universe(n, seed=0):
+    """Revenues, share counts and prices spanning implied growth of about -30% to 40%"""
+    rng = np.random.default_rng(seed)
+    revenue = rng.uniform(1e8, 1e11, n)
+    shares = rng.uniform(1e7, 1e10, n)
+    price_fcf, _ = evaluate_batch(10, rng.uniform(-30, 40, n), 15, 12, 18, 20, 10, revenue, shares)
+    return revenue, shares, price_fcf
+
+
+if __name__ == "__main__":
+    for n_tickers in UNIVERSE_SIZES:
+        revenue, shares, price = random_universe(n_tickers)
+        for solver in (implied_growth, implied_return):
+            for model in ('fcf', 'profit'):
+                start = time.perf_counter()
+                solution = solver(price, ASSUMPTIONS, revenue, shares, model=model)
+                elapsed = time.perf_counter() - start
+                print("{:>7,} tickers {:15} {:6}: {:8.1f} ms, {:6.2%} converged, "
+                      "{:2d} iterations max, residual {:.1e}".format(
+                          n_tickers, solver.__name__, model, elapsed * 1000, solution['converged'].mean(),
+                          solution['iterations'].max(), np.nanmax(solution['residual'])))
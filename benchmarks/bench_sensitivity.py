@@ -0,0 +1,33 @@
+"""Time of a 50 x 50 sensitivity grid: evaluate per cell, full grid, one changed row.
+Run from the repository root: python -m benchmarks.bench_sensitivity"""
+import time
+import numpy as np
+from sensitivity import SensitivityGrid
+from stock_valuation import Assumptions
+
+GROWTH = np.linspace(0, 20, 50)
+ROR = np.linspace(6, 14, 50)
+
+
+def per_cell():
+    for growth in GROWTH:
+        for ror in ROR:
+            Assumptions(10, growth, 20, 18, 20, 25, ror).evaluate(5.7e10, 9e8)
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    per_cell()
+    cell_time = time.perf_counter() - start
+    start = time.perf_counter()
+    grid = SensitivityGrid(Assumptions(10, 8, 20, 18, 20, 25, 10), 5.7e10, 9e8,
+                           'rev_growth', GROWTH, 'desired_ror', ROR)
+    grid_time = time.perf_counter() - start
+    changed = GROWTH.copy()
+    changed[10] += 0.5
+    start = time.perf_counter()
+    grid.set_row_values(changed)
+    row_time = time.perf_counter() - start
+    print("2,500 evaluate calls: {:9.3f} ms".format(cell_time * 1000))
+    print("Full grid:            {:9.3f} ms".format(grid_time * 1000))
+    print("One changed row:      {:9.3f} ms".format(row_time * 1000))
@@ -0,0 +1,67 @@
+"""Latency of the valuation service for cached tickers.
+Run from the repository root: python -m benchmarks.bench_service"""
+import http.client
+import json
+import threading
+import time
+import numpy as np
+from service import ValuationService, serve
+from benchmarks.synthetic import SyntheticSource, ticker_symbols
+
+N_TICKERS = 200
+N_REQUESTS = 5000
+ASSUMPTIONS = {'years': 10, 'rev_growth': 8, 'profit_margin': 20, 'fcf_margin': 18, 'pe': 20, 'pfcf': 25, 'ror': 10}
+
+
+def request(connection, method, path, body=None):
+    start = time.perf_counter()
+    connection.request(method, path, body=body and json.dumps(body),
+                       headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    assert response.status == 200, response.status
+    return time.perf_counter() - start
+
+
+def percentiles(latencies) -> str:
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return "p50 {:6.3f} ms   p99 {:6.3f} ms".format(p50, p99)
+
+
+if __name__ == "__main__":
+    source = SyntheticSource()
+    valuation_service = ValuationService('synthetic', source=source, cache=None)
+    server = serve(valuation_service, port=0)
+    host, port = server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port)
+    tickers = ticker_symbols(N_TICKERS)
+
+    # Eight clients asking for the same cold ticker share one upstream fetch
+    fetches = []
+    fetch = source.fetch
+    source.fetch = lambda *args: fetches.append(args) or time.sleep(0.05) or fetch(*args)
+    clients = [threading.Thread(target=request, args=(http.client.HTTPConnection(host, port), 'GET', '/stock/COLD'))
+               for _ in range(8)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    source.fetch = fetch
+    print("8 concurrent cold requests: {} upstream loads".format(
+        sum(function == 'OVERVIEW' for function, *_ in fetches)))
+
+    for ticker in tickers:
+        request(connection, 'GET', '/stock/' + ticker)
+    rng = np.random.default_rng(0)
+    stock_latencies = [request(connection, 'GET', '/stock/' + tickers[i])
+                       for i in rng.integers(0, N_TICKERS, N_REQUESTS)]
+    evaluate_latencies = [request(connection, 'POST', '/evaluate',
+                                  {'symbol': tickers[i], 'assumptions': dict(ASSUMPTIONS, rev_growth=float(growth))})
+                          for i, growth in zip(rng.integers(0, N_TICKERS, N_REQUESTS), rng.uniform(0, 20, N_REQUESTS))]
+    batch = [{'symbol': tickers[i], 'assumptions': ASSUMPTIONS} for i in range(100)]
+    batch_latencies = [request(connection, 'POST', '/evaluate', batch) for _ in range(200)]
+    print("GET /stock (cached):           " + percentiles(stock_latencies))
+    print("POST /evaluate (new scenario): " + percentiles(evaluate_latencies))
+    print("POST /evaluate (batch of 100): " + percentiles(batch_latencies))
+    server.shutdown()
+    valuation_service.close()
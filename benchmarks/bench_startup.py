@@ -0,0 +1,70 @@
+"""Start-up time of the command line programs and of importing the core, each
+run in a fresh interpreter like a cron job would.
+Run from the repository root: python -m benchmarks.bench_startup [--runs 10]"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from data_sources import save_fixture
+from benchmarks.synthetic import synthetic_payloads, ticker_symbols
+
+N_TICKERS = 20
+HEAVY_MODULES = ('numpy', 'requests', 'matplotlib', 'tkinter')
+ASSUMPTIONS = {"years": 10, "rev_growth": [5, 10], "profit_margin": [15, 20], "fcf_margin": [12, 18],
+               "pe": [15, 20], "pfcf": [15, 22], "ror": [12, 10]}
+
+
+def cases(directory: str) -> dict:
+    fixtures = os.path.join(directory, 'fixtures')
+    tickers = os.path.join(directory, 'tickers.txt')
+    assumptions = os.path.join(directory, 'assumptions.json')
+    rng = np.random.default_rng(0)
+    for symbol in ticker_symbols(N_TICKERS):
+        for function, data in synthetic_payloads(symbol, rng).items():
+            save_fixture(fixtures, function, symbol, data)
+    with open(tickers, 'w') as tickers_file:
+        tickers_file.write('\n'.join(ticker_symbols(N_TICKERS)))
+    with open(assumptions, 'w') as assumptions_file:
+        json.dump(ASSUMPTIONS, assumptions_file)
+    return {'interpreter': ['-c', 'pass'],
+            'import stock_valuation': ['-c', 'import stock_valuation'],
+            'import gui': ['-c', 'import gui'],
+            'screen --help': ['-m', 'screen', '--help'],
+            'screen {} tickers (replay)'.format(N_TICKERS):
+                ['-m', 'screen', tickers, assumptions, '--replay', fixtures,
+                 '-o', os.path.join(directory, 'ranking.csv')]}
+
+
+def run(arguments, runs: int):
+    """Median wall time of the runs in seconds, None when the program fails"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        if subprocess.run([sys.executable] + arguments, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL).returncode != 0:
+            return None
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def loaded_modules(module: str) -> list:
+    """The heavy dependencies importing the module pulls in"""
+    code = 'import sys, {}; print(" ".join(m for m in {!r} if m in sys.modules))'.format(module, HEAVY_MODULES)
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True).stdout.split()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the start-up of the programs.")
+    parser.add_argument('--runs', type=int, default=10, help="runs per case, the median is shown")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        for name, arguments in cases(temporary_directory).items():
+            median = run(arguments, args.runs)
+            print("{:32} {}".format(name, "failed" if median is None else "{:8.1f} ms".format(median * 1000)))
+    for module in ('stock_valuation', 'screen', 'gui'):
+        print("import {:25} loads {}".format(module, ', '.join(loaded_modules(module)) or 'nothing heavy'))
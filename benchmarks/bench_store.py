@@ -0,0 +1,45 @@
+"""Parse + load time of the columnar fundamentals store against parse_statements.
+Run from the repository root: python -m benchmarks.bench_store"""
+import json
+import tempfile
+import time
+from fundamentals_store import FundamentalsStore
+from stock_valuation import StockData, parse_statements
+from benchmarks.synthetic import synthetic_universe
+
+N_TICKERS = 3000
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def decode_and_parse(raw_payloads):
+    """What every run does today: decode the cached JSON and walk the dicts"""
+    for symbol, raw in raw_payloads:
+        parse_statements(StockData(symbol, payloads={function: json.loads(text)
+                                                     for function, text in raw.items()}))
+
+
+if __name__ == "__main__":
+    stocks = synthetic_universe(N_TICKERS)
+    raw_payloads = [(stock.symbol, {'INCOME_STATEMENT': json.dumps(stock.income_statement),
+                                    'BALANCE_SHEET': json.dumps(stock.balance_sheet),
+                                    'CASH_FLOW': json.dumps(stock.cash_flow),
+                                    'OVERVIEW': json.dumps(stock.overview)})
+                    for stock in stocks]
+    _, parse_time = timed(decode_and_parse, raw_payloads)
+    store, build_time = timed(FundamentalsStore.from_stocks, stocks)
+    with tempfile.TemporaryDirectory() as directory:
+        store.save(directory)
+        loaded, load_time = timed(FundamentalsStore.load, directory)
+        _, slice_time = timed(lambda: [loaded.statements(ticker) for ticker in loaded.tickers])
+        _, matrix_time = timed(lambda: [loaded.matrix(field) for field in loaded.columns])
+    print("{} tickers".format(N_TICKERS))
+    print("Decode JSON + parse_statements: {:8.3f} s".format(parse_time))
+    print("Build store once:               {:8.3f} s".format(build_time))
+    print("Load store (memory-mapped):     {:8.3f} s".format(load_time))
+    print("Per-ticker statements slices:   {:8.3f} s".format(slice_time))
+    print("All fields as ticker x year:    {:8.3f} s".format(matrix_time))
@@ -0,0 +1,204 @@
+"""Reproducible benchmark suite of the valuation pipeline on synthetic universes.
+Every case runs in its own process so its peak RSS can be measured, and is
+repeated until it ran for a minimum total time. The best time gives the
+throughput, the median is reported alongside. Results are saved as JSON and
+can be compared with an earlier run, the suite exits with status 1 when a
+throughput drops or a peak RSS grows by more than the threshold (a looser one
+for small universes, whose timings are mostly overhead).
+Run from the repository root:
+    python -m benchmarks.suite --sizes 1000 10000 100000 --save results.json
+    python -m benchmarks.suite --compare results.json --threshold 0.2"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from fundamentals_store import FundamentalsStore
+from historical_metrics import metrics_from_store
+from instrumentation import peak_rss_mb
+from screen import screen
+from stock_valuation import Assumptions, evaluate_batch, parse_statements
+from benchmarks.synthetic import SyntheticSource, iter_synthetic_stocks, ticker_symbols
+
+DEFAULT_SIZES = (1000, 10000)
+# Universes below SMALL_SIZE are compared with the small threshold
+SMALL_SIZE = 1000
+LOW = Assumptions(10, 5, 15, 12, 15, 15, 12)
+HIGH = Assumptions(10, 12, 22, 20, 22, 25, 9)
+
+
+# Each case prepares its input and returns a function that runs the timed part
+# once and returns its duration in seconds
+
+
+def case_parse(n_tickers: int):
+    """parse_statements of every ticker"""
+    def run():
+        elapsed = 0.0
+        for stock in iter_synthetic_stocks(n_tickers):
+            start = time.perf_counter()
+            parse_statements(stock)
+            elapsed += time.perf_counter() - start
+        return elapsed
+    return run
+
+
+def revenues_and_shares(n_tickers: int):
+    revenue, shares = np.empty(n_tickers), np.empty(n_tickers)
+    for index, stock in enumerate(iter_synthetic_stocks(n_tickers)):
+        revenue[index] = stock.trailing_twelve_months()
+        shares[index] = int(stock.overview['SharesOutstanding'])
+    return revenue, shares
+
+
+def case_evaluate(n_tickers: int):
+    """Assumptions.evaluate of every ticker"""
+    revenue, shares = revenues_and_shares(n_tickers)
+
+    def run():
+        start = time.perf_counter()
+        for ticker_revenue, ticker_shares in zip(revenue.tolist(), shares.tolist()):
+            LOW.evaluate(ticker_revenue, ticker_shares)
+        return time.perf_counter() - start
+    return run
+
+
+def case_evaluate_batch(n_tickers: int):
+    """evaluate_batch of all tickers at once"""
+    revenue, shares = revenues_and_shares(n_tickers)
+
+    def run():
+        start = time.perf_counter()
+        evaluate_batch(10, 5, 15, 12, 15, 15, 12, revenue, shares)
+        return time.perf_counter() - start
+    return run
+
+
+def case_metrics(n_tickers: int):
+    """Historical metrics of the universe from the columnar store"""
+    store = FundamentalsStore.from_stocks(iter_synthetic_stocks(n_tickers))
+
+    def run():
+        start = time.perf_counter()
+        metrics_from_store(store)
+        return time.perf_counter() - start
+    return run
+
+
+def case_end_to_end(n_tickers: int):
+    """Fetch (JSON decoding, no network) -> parse -> evaluate of the screening pipeline"""
+    source = SyntheticSource()
+
+    def run():
+        start = time.perf_counter()
+        for row in screen(ticker_symbols(n_tickers), 'synthetic', LOW, HIGH, source=source, cache=None):
+            if row['error']:
+                raise RuntimeError(row['error'])
+        return time.perf_counter() - start
+    return run
+
+
+CASES = {'parse': case_parse,
+         'evaluate': case_evaluate,
+         'evaluate_batch': case_evaluate_batch,
+         'metrics': case_metrics,
+         'end_to_end': case_end_to_end}
+
+
+def measure(run, min_time: float, min_repeats: int) -> list:
+    """Durations of repeated calls of run, at least min_repeats of them and
+    together at least min_time seconds"""
+    times = []
+    while len(times) < min_repeats or sum(times) < min_time:
+        times.append(run())
+    return times
+
+
+def run_case(name: str, n_tickers: int, min_time: float, min_repeats: int) -> dict:
+    times = measure(CASES[name](n_tickers), min_time, min_repeats)
+    best = min(times)
+    return {'seconds': best, 'median_seconds': float(np.median(times)), 'repeats': len(times),
+            'throughput': n_tickers / best, 'peak_rss_mb': peak_rss_mb()}
+
+
+def run_case_in_process(name: str, n_tickers: int, min_time: float, min_repeats: int) -> dict:
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.suite', '--run-case', name, str(n_tickers),
+                             '--min-time', str(min_time), '--min-repeats', str(min_repeats)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def environment() -> dict:
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'system': platform.system(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def regressions(results: dict, baseline: dict, threshold: float, small_threshold: float) -> list:
+    """Messages for each tracked metric that got worse than the threshold allows,
+    small_threshold applies to universes below SMALL_SIZE"""
+    messages = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        old = baseline[key]
+        allowed = small_threshold if int(key.rsplit('/', 1)[1]) < SMALL_SIZE else threshold
+        if result['throughput'] < old['throughput'] * (1 - allowed):
+            messages.append("{}: throughput {:,.0f}/s, was {:,.0f}/s".format(key, result['throughput'],
+                                                                            old['throughput']))
+        if (result['peak_rss_mb'] is not None and old.get('peak_rss_mb') is not None
+                and result['peak_rss_mb'] > old['peak_rss_mb'] * (1 + allowed)):
+            messages.append("{}: peak RSS {:.1f} MB, was {:.1f} MB".format(key, result['peak_rss_mb'],
+                                                                          old['peak_rss_mb']))
+    return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the valuation pipeline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="universe sizes")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--save', metavar='FILE', help="save the results as JSON")
+    parser.add_argument('--compare', metavar='FILE', help="fail on regressions against saved results")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed relative throughput drop / peak RSS growth (default 0.25)")
+    parser.add_argument('--small-threshold', type=float, default=0.5,
+                        help="threshold for universes below {} tickers (default 0.5)".format(SMALL_SIZE))
+    parser.add_argument('--min-time', type=float, default=1.0,
+                        help="repeat each case for at least this many seconds (default 1)")
+    parser.add_argument('--min-repeats', type=int, default=3, help="repeat each case at least this often")
+    parser.add_argument('--run-case', nargs=2, metavar=('CASE', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case[0], int(args.run_case[1]), args.min_time, args.min_repeats)))
+        return 0
+
+    results = {}
+    print("{:<24}{:>12}{:>12}{:>9}{:>16}{:>12}".format("Case", "Best [s]", "Median [s]", "Runs", "Tickers/s",
+                                                     "RSS [MB]"))
+    for name in args.cases:
+        for n_tickers in args.sizes:
+            key = "{}/{}".format(name, n_tickers)
+            result = results[key] = run_case_in_process(name, n_tickers, args.min_time, args.min_repeats)
+            print("{:<24}{:>12.4f}{:>12.4f}{:>9}{:>16,.0f}{:>12.1f}".format(
+                key, result['seconds'], result['median_seconds'], result['repeats'], result['throughput'],
+                result['peak_rss_mb'] or float('nan')))
+    if args.save:
+        with open(args.save, 'w') as results_file:
+            json.dump({'environment': environment(), 'results': results}, results_file, indent=1)
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        messages = regressions(results, baseline, args.threshold, args.small_threshold)
+        for message in messages:
+            print("REGRESSION " + message)
+        if messages:
+            return 1
+        print("No regressions beyond {:.0%}".format(args.threshold))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Synthetic Alpha Vantage shaped payloads for benchmarks"""
+import json
+import zlib
+import numpy as np
+from data_sources import DataSource
+from stock_valuation import StockData
+
+# Fields the valuation doesn't read, present so payloads have a realistic size
+INCOME_FILLER = ('grossProfit', 'costOfRevenue', 'costofGoodsAndServicesSold', 'operatingIncome',
+                 'sellingGeneralAndAdministrative', 'researchAndDevelopment', 'operatingExpenses',
+                 'interestIncome', 'interestExpense', 'depreciationAndAmortization', 'incomeBeforeTax',
+                 'incomeTaxExpense', 'ebit', 'ebitda')
+CASH_FLOW_FILLER = ('paymentsForOperatingActivities', 'changeInOperatingLiabilities', 'changeInInventory',
+                    'depreciationDepletionAndAmortization', 'cashflowFromInvestment', 'cashflowFromFinancing',
+                    'dividendPayout', 'paymentsForRepurchaseOfCommonStock', 'changeInCashAndCashEquivalents')
+BALANCE_FIELDS = ('totalAssets', 'totalCurrentAssets', 'cashAndCashEquivalentsAtCarryingValue', 'inventory',
+                  'propertyPlantEquipment', 'goodwill', 'totalLiabilities', 'totalCurrentLiabilities',
+                  'longTermDebt', 'shortTermDebt', 'totalShareholderEquity', 'retainedEarnings',
+                  'commonStockSharesOutstanding')
+
+
+def synthetic_payloads(symbol: str, rng, n_years=5, n_quarters=8) -> dict:
+    """Income statement, balance sheet, cash flow and overview of a made up company,
+    annual and quarterly reports, most recent first"""
+    revenue = rng.uniform(1e8, 1e11) * np.cumprod(np.full(n_years, 1 / (1 + rng.uniform(-0.05, 0.25))))
+    net_income = revenue * rng.uniform(-0.05, 0.3, n_years)
+    operating_cash_flow = revenue * rng.uniform(0.05, 0.35, n_years)
+    capex = revenue * rng.uniform(0.01, 0.1, n_years)
+    quarterly_revenue = np.repeat(revenue, 4)[:n_quarters] * rng.uniform(0.22, 0.28, n_quarters)
+    dates = ['{}-12-31'.format(2022 - year) for year in range(n_years)]
+    quarter_dates = ['{}-{}'.format(2022 - quarter // 4, ('12-31', '09-30', '06-30', '03-31')[quarter % 4])
+                     for quarter in range(n_quarters)]
+
+    def filler(fields, scale):
+        return {field: str(int(value)) for field, value in zip(fields, scale * rng.uniform(0, 0.5, len(fields)))}
+
+    income_reports = [dict(filler(INCOME_FILLER, revenue[i]), fiscalDateEnding=dates[i], reportedCurrency='USD',
+                           totalRevenue=str(int(revenue[i])), netIncome=str(int(net_income[i])))
+                      for i in range(n_years)]
+    income_quarters = [dict(filler(INCOME_FILLER, quarterly_revenue[i]), fiscalDateEnding=quarter_dates[i],
+                            reportedCurrency='USD', totalRevenue=str(int(quarterly_revenue[i])),
+                            netIncome=str(int(quarterly_revenue[i] * 0.1)))
+                       for i in range(n_quarters)]
+    cash_flow_reports = [dict(filler(CASH_FLOW_FILLER, revenue[i]), fiscalDateEnding=dates[i], reportedCurrency='USD',
+                              operatingCashflow=str(int(operating_cash_flow[i])),
+                              capitalExpenditures=str(int(capex[i])))
+                         for i in range(n_years)]
+    cash_flow_quarters = [dict(filler(CASH_FLOW_FILLER, quarterly_revenue[i]), fiscalDateEnding=quarter_dates[i],
+                               reportedCurrency='USD', operatingCashflow=str(int(quarterly_revenue[i] * 0.2)),
+                               capitalExpenditures=str(int(quarterly_revenue[i] * 0.05)))
+                          for i in range(n_quarters)]
+    balance_reports = [dict(filler(BALANCE_FIELDS, 2 * revenue[i]), fiscalDateEnding=dates[i], reportedCurrency='USD')
+                       for i in range(n_years)]
+    balance_quarters = [dict(filler(BALANCE_FIELDS, 2 * quarterly_revenue[i]), fiscalDateEnding=quarter_dates[i],
+                             reportedCurrency='USD')
+                        for i in range(n_quarters)]
+    shares = int(rng.uniform(1e7, 1e10))
+    overview = {'Symbol': symbol, 'Currency': 'USD', 'LatestQuarter': quarter_dates[0],
+                'SharesOutstanding': str(shares),
+                'MarketCapitalization': str(int(shares * rng.uniform(5, 500))),
+                'PERatio': '{:.2f}'.format(rng.uniform(5, 60)),
+                'PriceToSalesRatioTTM': '{:.2f}'.format(rng.uniform(0.5, 15)),
+                'PriceToBookRatio': '{:.2f}'.format(rng.uniform(0.5, 20))}
+    return {'INCOME_STATEMENT': {'symbol': symbol, 'annualReports': income_reports,
+                                 'quarterlyReports': income_quarters},
+            'BALANCE_SHEET': {'symbol': symbol, 'annualReports': balance_reports,
+                              'quarterlyReports': balance_quarters},
+            'CASH_FLOW': {'symbol': symbol, 'annualReports': cash_flow_reports,
+                          'quarterlyReports': cash_flow_quarters},
+            'OVERVIEW': overview}
+
+
+def ticker_symbols(n_tickers: int) -> list:
+    return ['T{:06d}'.format(i) for i in range(n_tickers)]
+
+
+def iter_synthetic_stocks(n_tickers: int, seed=0, n_years=5):
+    """StockData built from synthetic payloads one at a time, no network involved"""
+    rng = np.random.default_rng(seed)
+    for symbol in ticker_symbols(n_tickers):
+        yield StockData(symbol, payloads=synthetic_payloads(symbol, rng, n_years))
+
+
+def synthetic_universe(n_tickers: int, seed=0, n_years=5) -> list:
+    return list(iter_synthetic_stocks(n_tickers, seed, n_years))
+
+
+class SyntheticSource(DataSource):
+    """Data source answering any symbol from a pool of pre-encoded synthetic
+    companies, responses are decoded from JSON like real ones"""
+    def __init__(self, pool_size=500, seed=0):
+        rng = np.random.default_rng(seed)
+        self.pool = [{function: json.dumps(data) for function, data in synthetic_payloads(symbol, rng).items()}
+                     for symbol in ticker_symbols(pool_size)]
+
+    def fetch(self, function, symbol, api_key=None, session=None):
+        return json.loads(self._encoded(function, symbol))
+
+    def fetch_raw(self, function, symbol, api_key=None, session=None, chunk_size=64 * 1024):
+        encoded = self._encoded(function, symbol).encode()
+        return [encoded[start:start + chunk_size] for start in range(0, len(encoded), chunk_size)]
+
+    def _encoded(self, function, symbol) -> str:
+        return self.pool[zlib.crc32(symbol.encode()) % len(self.pool)][function]
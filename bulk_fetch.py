@@ -0,0 +1,172 @@
+"""Fetch the statements of many ticker symbols concurrently.
+All requests share one token bucket so the calls are packed right up to the
+Alpha Vantage per-minute and per-day quota instead of waiting a minute between
+tickers. Usage: python bulk_fetch.py IBM MSFT AAPL (fills the response cache)"""
+import contextlib
+import datetime
+import itertools
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import stock_valuation
+from stock_valuation import STATEMENTS, StockData, fetch_data, get_api, response_cache
+
+
+class QuotaExceeded(Exception):
+    """Requests are still rejected by the quota after waiting for it"""
+
+
+class DailyQuotaExceeded(QuotaExceeded):
+    """The daily request quota is used up, no point in waiting for a refill"""
+
+
+def quota_message(data) -> str:
+    return data.get('Note', '') + data.get('Information', '') if isinstance(data, dict) else ''
+
+
+def is_quota_error(data) -> bool:
+    message = quota_message(data)
+    return 'call frequency' in message or 'rate limit' in message or 'requests per' in message
+
+
+def is_daily_quota_error(data) -> bool:
+    """The per-minute message mentions the daily limit too, the daily one only that"""
+    message = quota_message(data)
+    return 'per day' in message and 'per minute' not in message and 'per second' not in message
+
+
+class TokenBucket(object):
+    def __init__(self, calls=5, period=60, per_day=None, clock=time.monotonic, sleep=time.sleep,
+                 today=datetime.date.today):
+        """Allow `calls` requests per `period` seconds (the free key allows 5 per minute)
+        and at most per_day requests per calendar day"""
+        self.capacity = calls
+        self.tokens = float(calls)
+        self.refill_rate = calls / period
+        self.per_day = per_day
+        self.used_today = 0
+        self._clock = clock
+        self._sleep = sleep
+        self._today = today
+        self._day = today()
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be made"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.per_day is not None and self.used_today >= self.per_day:
+                    raise DailyQuotaExceeded("Daily quota of {} requests reached".format(self.per_day))
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.used_today += 1
+                    return
+                wait = (1 - self.tokens) / self.refill_rate
+            self._sleep(wait)
+
+    def drain(self):
+        """The provider rejected a request, so our view of the quota was too
+        optimistic, wait a full period before the next request"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 1.0 - self.capacity)
+
+    def _refill(self):
+        day = self._today()
+        if day != self._day:
+            self._day = day
+            self.used_today = 0
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+
+def make_session(max_workers: int):
+    """requests.Session with a connection pool large enough for all workers"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_statements(ticker_symbol, api_key, limiter, session=None, functions=STATEMENTS,
+                     cache=response_cache, source=None, max_retries=5) -> dict:
+    """Fetch all functions of one ticker, retrying requests rejected by the
+    per-minute quota, raises DailyQuotaExceeded once the daily quota is used up"""
+    payloads = {}
+    for function in functions:
+        for _ in range(max_retries + 1):
+            data = fetch_data(function, ticker_symbol, api_key, cache=cache,
+                              session=session, limiter=limiter, source=source)
+            if is_daily_quota_error(data):
+                raise DailyQuotaExceeded(quota_message(data))
+            if not is_quota_error(data):
+                break
+            if limiter is not None:
+                limiter.drain()
+        else:
+            raise QuotaExceeded("{} {} still rejected after {} retries".format(function, ticker_symbol,
+                                                                               max_retries))
+        payloads[function] = data
+    return payloads
+
+
+def iter_fetch(tickers, api_key, max_workers=4, limiter=None, functions=STATEMENTS,
+               cache=response_cache, source=None, fetch=fetch_statements):
+    """
+    Fetch the tickers concurrently. At most 2 * max_workers tickers are in
+    flight, so memory stays bounded however long the tickers iterable is.
+    fetch is called like fetch_statements for every ticker and its result is yielded.
+    :return: generator of (ticker, payloads) in order of completion, payloads
+             is the raised exception when the ticker failed. Once the daily
+             quota is used up no more requests are made, the remaining
+             tickers are yielded with the DailyQuotaExceeded error.
+    """
+    if limiter is None and (source or stock_valuation.data_source).rate_limited:
+        limiter = TokenBucket()
+    remote = (source or stock_valuation.data_source).remote
+    tickers = iter(tickers)
+    with (make_session(max_workers) if remote else contextlib.nullcontext()) as session, \
+            ThreadPoolExecutor(max_workers) as executor:
+        pending = {}
+        exhausted = None
+        while True:
+            if exhausted is None:
+                for ticker in itertools.islice(tickers, 2 * max_workers - len(pending)):
+                    pending[executor.submit(fetch, ticker, api_key, limiter, session,
+                                            functions, cache, source)] = ticker
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker = pending.pop(future)
+                try:
+                    yield ticker, future.result()
+                except DailyQuotaExceeded as error:
+                    exhausted = error
+                    yield ticker, error
+                # requests.RequestException is an OSError
+                except (QuotaExceeded, OSError, ValueError) as error:
+                    yield ticker, error
+    for ticker in tickers:
+        yield ticker, exhausted
+
+
+def fetch_many(tickers, api_key, **kwargs) -> dict:
+    """Bulk version of StockData, tickers that failed are left out"""
+    source = kwargs.get('source') or stock_valuation.data_source
+    cache = kwargs.get('cache', response_cache)
+    return {ticker: StockData(ticker, api_key, payloads=payloads, source=source, cache=cache)
+            for ticker, payloads in iter_fetch(tickers, api_key, **kwargs)
+            if not isinstance(payloads, Exception)}
+
+
+if __name__ == "__main__":
+    for symbol, result in iter_fetch(sys.argv[1:], get_api()):
+        print(symbol, "failed: {}".format(result) if isinstance(result, Exception) else "fetched")
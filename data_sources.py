@@ -0,0 +1,226 @@
+"""Where fetch_data gets the Alpha Vantage responses from.
+AlphaVantageSource queries the web API (or anything serving the same URLs),
+RecordingSource saves every response another source returns and ReplaySource
+serves saved responses from disk. serve_fixtures runs a local HTTP server with
+the same URLs as Alpha Vantage on top of saved responses, so the whole
+pipeline can run and be benchmarked without network access.
+Usage: python data_sources.py fixtures_dir [--port 8000] [--calls-per-minute 5]"""
+import argparse
+import json
+import os
+import threading
+import time
+from instrumentation import stats
+from response_cache import is_error_response
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+QUOTA_MESSAGE = ("Thank you for using Alpha Vantage! Our standard API call frequency is "
+                 "5 calls per minute and 500 calls per day.")
+DAILY_QUOTA_MESSAGE = ("Thank you for using Alpha Vantage! Our standard API rate limit is "
+                       "25 requests per day.")
+INVALID_CALL_MESSAGE = "Invalid API call. Please retry or visit the documentation for {}."
+CHUNK_SIZE = 64 * 1024
+
+
+class DataSource(object):
+    """Interface of the data sources"""
+    # Whether the requests count against the Alpha Vantage quota
+    rate_limited = False
+    # Whether fetch makes HTTP requests, so a pooled requests.Session pays off
+    remote = False
+
+    def fetch(self, function: str, symbol: str, api_key: str, session=None) -> dict:
+        raise NotImplementedError
+
+    def fetch_raw(self, function: str, symbol: str, api_key: str, session=None, chunk_size=CHUNK_SIZE):
+        """The undecoded JSON response as an iterable of byte chunks"""
+        return [json.dumps(self.fetch(function, symbol, api_key, session)).encode()]
+
+
+class AlphaVantageSource(DataSource):
+    rate_limited = True
+    remote = True
+
+    def __init__(self, base_url=ALPHA_VANTAGE_URL):
+        self.base_url = base_url
+
+    def fetch(self, function, symbol, api_key, session=None):
+        url = self.base_url + '?function={}&symbol={}&apikey={}'
+        if session is None:
+            # Imported on first use, it's the slowest import and replayed runs don't need it
+            import requests
+            session = requests
+        start = time.perf_counter()
+        requested_data = session.get(url.format(function, symbol, api_key))
+        if stats.enabled:
+            latency = time.perf_counter() - start
+            stats.add_time('request', latency, start, {'function': function, 'symbol': symbol})
+            stats.record_request(latency, len(requested_data.content))
+        with stats.stage('decode', function=function, symbol=symbol):
+            return requested_data.json()
+
+    def fetch_raw(self, function, symbol, api_key, session=None, chunk_size=CHUNK_SIZE):
+        """Stream the response body, it is never held in memory as a whole"""
+        if session is None:
+            import requests
+            session = requests
+        url = self.base_url + '?function={}&symbol={}&apikey={}'
+        start = time.perf_counter()
+        size = 0
+        with session.get(url.format(function, symbol, api_key), stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size):
+                size += len(chunk)
+                yield chunk
+        if stats.enabled:
+            latency = time.perf_counter() - start
+            stats.add_time('request', latency, start, {'function': function, 'symbol': symbol})
+            stats.record_request(latency, size)
+
+
+class RecordingSource(DataSource):
+    """Pass requests on to another source and save the valid responses"""
+    def __init__(self, source, directory: str):
+        self.source = source
+        self.directory = directory
+        self.rate_limited = source.rate_limited
+        self.remote = source.remote
+
+    def fetch(self, function, symbol, api_key, session=None):
+        data = self.source.fetch(function, symbol, api_key, session)
+        if not is_error_response(data):
+            save_fixture(self.directory, function, symbol, data)
+        return data
+
+
+class ReplaySource(DataSource):
+    """Serve saved responses, unknown symbols get the Alpha Vantage error response"""
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch(self, function, symbol, api_key=None, session=None):
+        try:
+            with stats.stage('replay', function=function, symbol=symbol), \
+                    open(fixture_path(self.directory, function, symbol), 'r') as fixture_file:
+                return json.load(fixture_file)
+        except FileNotFoundError:
+            return {'Error Message': INVALID_CALL_MESSAGE.format(function)}
+
+    def fetch_raw(self, function, symbol, api_key=None, session=None, chunk_size=CHUNK_SIZE):
+        try:
+            fixture_file = open(fixture_path(self.directory, function, symbol), 'rb')
+        except FileNotFoundError:
+            yield json.dumps({'Error Message': INVALID_CALL_MESSAGE.format(function)}).encode()
+            return
+        with fixture_file:
+            yield from iter(lambda: fixture_file.read(chunk_size), b'')
+
+
+def fixture_path(directory: str, function: str, symbol: str) -> str:
+    return os.path.join(directory, function, symbol.upper() + '.json')
+
+
+def save_fixture(directory: str, function: str, symbol: str, data):
+    os.makedirs(os.path.join(directory, function), exist_ok=True)
+    with open(fixture_path(directory, function, symbol), 'w') as fixture_file:
+        json.dump(data, fixture_file)
+
+
+def add_arguments(parser):
+    """Command line options choosing the data source, see from_args"""
+    parser.add_argument('--base-url', help="query another server with the Alpha Vantage URLs, "
+                                           "e.g. one started by data_sources.py")
+    parser.add_argument('--record', metavar='DIR', help="save every response in DIR, skips the response cache")
+    parser.add_argument('--replay', metavar='DIR', help="use the responses saved in DIR, no network")
+
+
+def from_args(args) -> DataSource:
+    if args.replay:
+        return ReplaySource(args.replay)
+    source = AlphaVantageSource(args.base_url) if args.base_url else AlphaVantageSource()
+    return RecordingSource(source, args.record) if args.record else source
+
+
+def cache_from_args(args, cache):
+    """The response cache to use with the source of from_args. Replayed runs
+    don't need it and recorded runs skip it, the RecordingSource would only
+    see the cache misses."""
+    return None if args.replay or args.record else cache
+
+
+def serve_fixtures(directory: str, host='127.0.0.1', port=0, calls_per_minute=None, calls_per_day=None,
+                   clock=time.monotonic):
+    """
+    Start a server answering /query?function=...&symbol=... from saved responses
+    in a background thread. With calls_per_minute or calls_per_day the server
+    answers like Alpha Vantage does once the quota is used up. The quota windows
+    are measured with clock, tests pass the clock their rate limiter sleeps on.
+    :return: the server, its URL is server.url, stop it with server.shutdown()
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+    replay = ReplaySource(directory)
+    lock = threading.Lock()
+    recent_calls = []
+    # Calls answered per day number of the clock
+    daily_calls = {}
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        # Keep-alive, so pooled sessions reuse their connections
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            quota_error = over_quota()
+            if quota_error is not None:
+                data = {'Note': quota_error}
+            else:
+                data = replay.fetch(query.get('function', [''])[0], query.get('symbol', [''])[0])
+            body = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    def over_quota():
+        """The quota message when the call is rejected, otherwise None and the call is counted"""
+        with lock:
+            now = clock()
+            day = int(now // (24 * 60 * 60))
+            if calls_per_day is not None and daily_calls.get(day, 0) >= calls_per_day:
+                return DAILY_QUOTA_MESSAGE
+            while recent_calls and recent_calls[0] <= now - 60:
+                recent_calls.pop(0)
+            if calls_per_minute is not None and len(recent_calls) >= calls_per_minute:
+                return QUOTA_MESSAGE
+            recent_calls.append(now)
+            daily_calls[day] = daily_calls.get(day, 0) + 1
+            return None
+
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    server.daemon_threads = True
+    server.url = 'http://{}:{}/query'.format(*server.server_address[:2])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve saved Alpha Vantage responses.")
+    parser.add_argument('directory', help="directory of saved responses (see RecordingSource)")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--calls-per-minute', type=int, help="simulate the API quota")
+    parser.add_argument('--calls-per-day', type=int, help="simulate the daily API quota")
+    args = parser.parse_args()
+    fixture_server = serve_fixtures(args.directory, port=args.port, calls_per_minute=args.calls_per_minute,
+                                    calls_per_day=args.calls_per_day)
+    print("Serving {} at {}, press Ctrl+C to stop".format(args.directory, fixture_server.url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fixture_server.shutdown()
@@ -0,0 +1,234 @@
+"""Columnar store of the annual statement fields used by the valuation.
+Statements are parsed once into one flat NumPy array per field, rows are grouped
+by ticker (most recent fiscal year first) and located through an offsets array,
+so the history of a ticker is an array slice instead of a walk over JSON dicts.
+The latest reported quarter, the quarter last announced by the overview and the
+shares outstanding of each ticker are kept as well (see refresh.py and parallel.py).
+The store is saved as one .npy file per array and can be memory-mapped back."""
+import json
+import os
+import numpy as np
+
+# Field name -> statement it is taken from
+FIELDS = {'totalRevenue': 'income_statement',
+          'netIncome': 'income_statement',
+          'operatingCashflow': 'cash_flow',
+          'capitalExpenditures': 'cash_flow'}
+
+
+def to_number(value) -> float:
+    """Statement values are strings, missing ones are reported as 'None'"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class FundamentalsStore(object):
+    def __init__(self, tickers, offsets, fiscal_date, columns, latest_quarter=None, shares_outstanding=None,
+                 announced_quarter=None):
+        self.tickers = np.asarray(tickers, dtype=str)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.fiscal_date = np.asarray(fiscal_date, dtype='datetime64[D]')
+        self.columns = columns
+        if latest_quarter is None:
+            latest_quarter = np.full(len(self.tickers), np.datetime64('NaT'), dtype='datetime64[D]')
+        self.latest_quarter = np.asarray(latest_quarter, dtype='datetime64[D]')
+        if announced_quarter is None:
+            announced_quarter = np.full(len(self.tickers), np.datetime64('NaT'), dtype='datetime64[D]')
+        self.announced_quarter = np.asarray(announced_quarter, dtype='datetime64[D]')
+        if shares_outstanding is None:
+            shares_outstanding = np.full(len(self.tickers), np.nan)
+        self.shares_outstanding = np.asarray(shares_outstanding, dtype=float)
+        self._positions = {ticker: index for index, ticker in enumerate(self.tickers.tolist())}
+        self._fiscal_year = None
+
+    @classmethod
+    def from_stocks(cls, stocks):
+        """Build the store from an iterable of StockData (or anything with the same statements)"""
+        tickers, counts, dates, latest, shares, announced = [], [], [], [], [], []
+        values = {field: [] for field in FIELDS}
+        for stock in stocks:
+            rows = annual_rows(stock)
+            tickers.append(stock.symbol)
+            counts.append(len(rows))
+            latest.append(latest_quarter(stock))
+            shares.append(shares_outstanding(stock))
+            announced.append(announced_quarter(stock))
+            for fiscal_date, row in rows:
+                dates.append(fiscal_date)
+                for field in FIELDS:
+                    values[field].append(row[field])
+        offsets = np.zeros(len(tickers) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        columns = {field: np.array(values[field], dtype=float) for field in FIELDS}
+        return cls(tickers, offsets, np.array(dates, dtype='datetime64[D]'), columns,
+                   np.array(latest, dtype='datetime64[D]'), np.array(shares, dtype=float),
+                   np.array(announced, dtype='datetime64[D]'))
+
+    def merge(self, stocks):
+        """
+        New store with the annual reports of the stocks merged into the stored
+        history, reports of a fiscal date already stored replace the old ones.
+        Tickers not in the store yet are appended.
+        """
+        updates = {stock.symbol: stock for stock in stocks}
+        tickers = self.tickers.tolist() + [ticker for ticker in updates if ticker not in self]
+        counts, dates, latest, shares, announced = [], [], [], [], []
+        values = {field: [] for field in self.columns}
+        for index, ticker in enumerate(tickers):
+            if ticker not in updates:
+                rows = self.rows(ticker)
+                counts.append(rows.stop - rows.start)
+                dates.append(self.fiscal_date[rows])
+                for field, column in self.columns.items():
+                    values[field].append(column[rows])
+                latest.append(self.latest_quarter[index])
+                shares.append(self.shares_outstanding[index])
+                announced.append(self.announced_quarter[index])
+                continue
+            merged = {}
+            if ticker in self:
+                history = self.history(ticker)
+                for row_index, fiscal_date in enumerate(history['fiscalDateEnding'].astype(str)):
+                    merged[fiscal_date] = {field: history[field][row_index] for field in self.columns}
+            merged.update(annual_rows(updates[ticker]))
+            fiscal_dates = sorted(merged, reverse=True)
+            counts.append(len(fiscal_dates))
+            dates.append(np.array(fiscal_dates, dtype='datetime64[D]'))
+            for field in self.columns:
+                values[field].append(np.array([merged[date].get(field, np.nan) for date in fiscal_dates], dtype=float))
+            latest.append(latest_quarter(updates[ticker]))
+            shares.append(shares_outstanding(updates[ticker]))
+            announced.append(announced_quarter(updates[ticker]))
+        offsets = np.zeros(len(tickers) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return FundamentalsStore(tickers, offsets,
+                                 np.concatenate(dates) if dates else np.array([], dtype='datetime64[D]'),
+                                 {field: np.concatenate(pieces) if pieces else np.array([])
+                                  for field, pieces in values.items()},
+                                 np.array(latest, dtype='datetime64[D]'), np.array(shares, dtype=float),
+                                 np.array(announced, dtype='datetime64[D]'))
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._positions
+
+    def index(self, ticker) -> int:
+        """Position of the ticker in tickers (and the other per-ticker arrays)"""
+        return self._positions[ticker]
+
+    def rows(self, ticker) -> slice:
+        index = self._positions[ticker]
+        return slice(self.offsets[index], self.offsets[index + 1])
+
+    @property
+    def fiscal_year(self):
+        """Fiscal years as strings (like the keys used by parse_statements), computed once"""
+        if self._fiscal_year is None:
+            self._fiscal_year = self.fiscal_date.astype('datetime64[Y]').astype(str)
+        return self._fiscal_year
+
+    def history(self, ticker) -> dict:
+        """Views of all fields of one ticker, most recent fiscal year first"""
+        rows = self.rows(ticker)
+        history = {field: column[rows] for field, column in self.columns.items()}
+        history['fiscalDateEnding'] = self.fiscal_date[rows]
+        return history
+
+    def statements(self, ticker):
+        """Same result as parse_statements, as arrays"""
+        rows = self.rows(ticker)
+        columns = self.columns
+        revenue = columns['totalRevenue'][rows]
+        free_cash_flow = columns['operatingCashflow'][rows] - columns['capitalExpenditures'][rows]
+        return revenue, columns['netIncome'][rows] / revenue, free_cash_flow / revenue, self.fiscal_year[rows]
+
+    def matrix(self, field: str, n_years=5, start=0, stop=None):
+        """Tickers x years array of a field, most recent year first, padded with NaN.
+        start and stop select a range of tickers (positions in tickers)."""
+        stop = len(self) if stop is None else stop
+        offsets = self.offsets[start:stop + 1]
+        counts = np.diff(offsets)
+        ticker_index = np.repeat(np.arange(stop - start), counts)
+        year_index = np.arange(offsets[0], offsets[-1]) - offsets[:-1][ticker_index]
+        keep = year_index < n_years
+        matrix = np.full((stop - start, n_years), np.nan)
+        matrix[ticker_index[keep], year_index[keep]] = self.columns[field][offsets[0]:offsets[-1]][keep]
+        return matrix
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'tickers.npy'), self.tickers)
+        np.save(os.path.join(directory, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(directory, 'fiscal_date.npy'), self.fiscal_date)
+        np.save(os.path.join(directory, 'latest_quarter.npy'), self.latest_quarter)
+        np.save(os.path.join(directory, 'shares_outstanding.npy'), self.shares_outstanding)
+        np.save(os.path.join(directory, 'announced_quarter.npy'), self.announced_quarter)
+        for field, column in self.columns.items():
+            np.save(os.path.join(directory, field + '.npy'), column)
+        with open(os.path.join(directory, 'fields.json'), 'w') as fields_file:
+            json.dump(list(self.columns), fields_file)
+
+    @classmethod
+    def load(cls, directory: str, mmap=True):
+        """Load a saved store, the large arrays are memory-mapped unless mmap=False"""
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(directory, 'fields.json'), 'r') as fields_file:
+            fields = json.load(fields_file)
+        columns = {field: np.load(os.path.join(directory, field + '.npy'), mmap_mode=mmap_mode)
+                   for field in fields}
+        per_ticker = {}
+        for name in ('latest_quarter', 'shares_outstanding', 'announced_quarter'):
+            try:
+                per_ticker[name] = np.load(os.path.join(directory, name + '.npy'))
+            except FileNotFoundError:
+                # Saved before these were stored
+                per_ticker[name] = None
+        return cls(np.load(os.path.join(directory, 'tickers.npy')),
+                   np.load(os.path.join(directory, 'offsets.npy')),
+                   np.load(os.path.join(directory, 'fiscal_date.npy'), mmap_mode=mmap_mode),
+                   columns, **per_ticker)
+
+
+def latest_quarter(stock) -> np.datetime64:
+    """Most recent period reported in both the income and the cash flow
+    statement. The overview may announce a quarter before the statements
+    include it, so its LatestQuarter isn't used."""
+    latest = []
+    for statement in (stock.income_statement, stock.cash_flow):
+        dates = [report.get('fiscalDateEnding') for reports in ('quarterlyReports', 'annualReports')
+                 for report in statement.get(reports, [])]
+        dates = [date for date in dates if date and date != 'None']
+        if not dates:
+            return np.datetime64('NaT')
+        latest.append(max(dates))
+    return np.datetime64(min(latest), 'D')
+
+
+def announced_quarter(stock) -> np.datetime64:
+    """LatestQuarter of the overview, the quarter the company last announced"""
+    reported = (getattr(stock, 'overview', None) or {}).get('LatestQuarter')
+    return np.datetime64(reported, 'D') if reported and reported != 'None' else np.datetime64('NaT')
+
+
+def shares_outstanding(stock) -> float:
+    return to_number((getattr(stock, 'overview', None) or {}).get('SharesOutstanding'))
+
+
+def annual_rows(stock) -> list:
+    """(fiscal date, {field: value}) for each annual report, most recent first.
+    Cash flow reports are matched to income statements by fiscal date."""
+    cash_flow_by_date = {report['fiscalDateEnding']: report
+                         for report in stock.cash_flow.get('annualReports', [])}
+    rows = []
+    for income_report in stock.income_statement.get('annualReports', []):
+        fiscal_date = income_report['fiscalDateEnding']
+        reports = {'income_statement': income_report,
+                   'cash_flow': cash_flow_by_date.get(fiscal_date, {})}
+        rows.append((fiscal_date, {field: to_number(reports[statement].get(field))
+                                   for field, statement in FIELDS.items()}))
+    rows.sort(key=lambda row: row[0], reverse=True)
+    return rows
@@ -0,0 +1,123 @@
+"""Local, date-indexed table of exchange rates to USD.
+The table is loaded once from a CSV file (date,currency,usd_per_unit) and kept
+as one forward-filled daily array per currency, so converting an amount is an
+array lookup, on weekends and holidays the last known rate is used. Missing
+rates can be downloaded from exchangerate.host in a single request for all
+currencies and are saved back to the file."""
+import csv
+import datetime
+import os
+import numpy as np
+
+FX_RATES_FILE = "../StockValuation/fx_rates.csv"
+TIMESERIES_URL = 'https://api.exchangerate.host/timeseries?start_date={}&end_date={}&base=USD&symbols={}'
+
+
+class MissingRates(KeyError):
+    """The table has no rate of a currency on the date, the message tells how to
+    download it. A KeyError for the callers that handle missing data."""
+    def __str__(self):
+        return str(self.args[0])
+
+
+class FxRateTable(object):
+    def __init__(self):
+        # currency -> {date: USD per unit}, the source of the daily arrays
+        self.observations = {}
+        # currency -> (ordinal of the first day, forward-filled daily rates)
+        self._daily = {}
+
+    @classmethod
+    def load(cls, path=FX_RATES_FILE):
+        """Table from a CSV file, an empty table when the file doesn't exist"""
+        table = cls()
+        try:
+            with open(path, 'r', newline='') as rates_file:
+                for row in csv.DictReader(rates_file):
+                    table.observations.setdefault(row['currency'], {})[row['date']] = float(row['usd_per_unit'])
+        except FileNotFoundError:
+            pass
+        return table
+
+    def save(self, path=FX_RATES_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', newline='') as rates_file:
+            writer = csv.writer(rates_file)
+            writer.writerow(['date', 'currency', 'usd_per_unit'])
+            for currency, rates in sorted(self.observations.items()):
+                for date, rate in sorted(rates.items()):
+                    writer.writerow([date, currency, rate])
+
+    def add_rates(self, currency: str, rates: dict):
+        """Add {'YYYY-MM-DD': USD per unit} observations of a currency"""
+        self.observations.setdefault(currency, {}).update(rates)
+        self._daily.pop(currency, None)
+
+    def usd_per_unit(self, currency: str, date: str) -> float:
+        """Rate on the date, or the last rate before it. Raises MissingRates when
+        the table has no rate of the currency on or before the date."""
+        if currency == 'USD':
+            return 1.0
+        if currency not in self._daily:
+            self._build_daily(currency)
+        first_day, daily = self._daily[currency]
+        index = datetime.date.fromisoformat(date[:10]).toordinal() - first_day
+        if index < 0:
+            raise MissingRates("No {} rate on or before {}, download it with: python fx_rates.py {} --start {}-01-01"
+                               .format(currency, date[:10], currency, date[:4]))
+        return float(daily[min(index, len(daily) - 1)])
+
+    def to_usd(self, amount, currency: str, date: str):
+        return amount * self.usd_per_unit(currency, date)
+
+    def _build_daily(self, currency):
+        rates = self.observations.get(currency)
+        if not rates:
+            raise MissingRates("No {} rates in {}, download them with: python fx_rates.py {}".format(
+                currency, FX_RATES_FILE, currency))
+        days = np.array([datetime.date.fromisoformat(date).toordinal() for date in rates])
+        values = np.array(list(rates.values()), dtype=float)
+        first_day = days.min()
+        # Position of the last observation on or before each day
+        observed = np.zeros(days.max() - first_day + 1, dtype=np.int64)
+        order = np.argsort(days)
+        observed[days[order] - first_day] = np.arange(1, len(days) + 1)
+        last_observation = np.maximum.accumulate(observed) - 1
+        self._daily[currency] = (first_day, values[order][last_observation])
+
+    def download(self, currencies, start_date: str, end_date: str, session=None):
+        """Add the daily rates of the currencies between the dates with one request"""
+        if session is None:
+            import requests
+            session = requests
+        url = TIMESERIES_URL.format(start_date, end_date, ','.join(sorted(currencies)))
+        response = session.get(url).json()
+        for date, units_per_usd in response.get('rates', {}).items():
+            for currency, rate in units_per_usd.items():
+                self.add_rates(currency, {date: 1 / rate})
+
+
+_default_table = None
+
+
+def default_table() -> FxRateTable:
+    """The table in FX_RATES_FILE, loaded on first use"""
+    global _default_table
+    if _default_table is None:
+        _default_table = FxRateTable.load()
+    return _default_table
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Download exchange rates into the local table.")
+    parser.add_argument('currencies', nargs='+', help="currency codes, e.g. EUR JPY")
+    parser.add_argument('--start', default='2015-01-01', help="first date (YYYY-MM-DD)")
+    parser.add_argument('--end', default=datetime.date.today().isoformat(), help="last date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    rate_table = FxRateTable.load()
+    rate_table.download(args.currencies, args.start, args.end)
+    rate_table.save()
+    print("Saved rates of {} to {}".format(', '.join(args.currencies), FX_RATES_FILE))
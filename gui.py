@@ -1,9 +1,42 @@
+"""Tkinter front end of the stock valuation. The window is only built by
+StockWindow (python gui.py), so the module can be imported without a display
+and matplotlib is loaded when the window is created."""
 from tkinter import *
-from stock_valuation import *
+from tkinter import ttk
+import queue
+import sys
+import threading
 import webbrowser
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg,
-                                               NavigationToolbar2Tk)
+import numpy as np
+import historical_metrics
+from instrumentation import stats
+from monte_carlo import simulate
+from sensitivity import SensitivityGrid
+from stock_valuation import Assumptions, StockData
+
+# Set defaults for the UI
+background_color = "gray"
+YEAR_OPTIONS = list(range(1, 21))
+# Sensitivity of the fair value to two assumptions
+GRID_STEPS = 50
+SENSITIVITY_AXES = {"Revenue Growth": 'rev_growth', "Profit Margin": 'profit_margin', "FCF Margin": 'fcf_margin',
+                    "Future P/E": 'p_e', "Future P/FCF": 'p_fcf', "Desired ROR": 'desired_ror'}
+
+
+def axis_values(low, high, max_steps=GRID_STEPS):
+    """At most max_steps sensitivity axis values between low and high, the
+    whole multiples of a rounded step (1, 2, 2.5 or 5 times a power of ten).
+    Values stay the same when a bound moves as long as the step does, so
+    SensitivityGrid only values the rows or columns that were added."""
+    low, high = min(low, high), max(low, high)
+    if high == low:
+        return np.array([float(low)])
+    raw_step = (high - low) / (max_steps - 1)
+    magnitude = 10.0 ** np.floor(np.log10(raw_step))
+    step = next(factor * magnitude for factor in (1, 2, 2.5, 5, 10) if factor * magnitude >= raw_step)
+    # Tolerance for bounds that are multiples of the step up to rounding
+    first, last = np.ceil(low / step - 1e-9), np.floor(high / step + 1e-9)
+    return np.arange(first, last + 1) * step
 
 
 class AssumptionLine(object):
@@ -27,44 +60,91 @@ def data_display_line(label_text, place, variable, row=1, column=1):
     var.grid(row=row, column=column+1)
 
 
-def plot(revenue, fcf_margin, netprofit_margin, years):
-    revenue.reverse()
-    fcf_margin.reverse()
-    netprofit_margin.reverse()
-    years.reverse()
-
-    # the figure that will contain the plot
-    fig = Figure(figsize=(4, 4), layout='constrained', facecolor=background_color)
-
-    # adding the subplots
-    ax1 = fig.add_subplot(3, 1, 1)
-    ax2 = fig.add_subplot(3, 1, 2)
-    ax3 = fig.add_subplot(3, 1, 3)
-
-    # plotting the data
-    ax1.bar(years, revenue, color=background_color)
-    ax2.bar(years, fcf_margin, color=background_color)
-    ax3.bar(years, netprofit_margin, color=background_color)
-
-    ax1.set_facecolor('#eafff5')
-    ax2.set_facecolor('#eafff5')
-    ax3.set_facecolor('#eafff5')
-
-    # creating the Tkinter canvas
-    # containing the Matplotlib figure
-    canvas = FigureCanvasTkAgg(fig, master=mainWindow)
-    canvas.draw()
-
-    # placing the canvas on the Tkinter window
-    canvas.get_tk_widget().grid(row=0, column=3, rowspan=4, padx=5)
-    # creating the Matplotlib toolbar
-    toolbar = NavigationToolbar2Tk(canvas,
-                                   mainWindow,
-                                   pack_toolbar=False)
-    toolbar.update()
-
-    # placing the toolbar on the Tkinter window
-    # canvas.get_tk_widget().grid(row=0, column=3, padx=5)
+class BackgroundWorker(object):
+    """Run one task at a time in a background thread so the window stays responsive.
+    The result is handed back on the Tk main loop by polling a queue with after(),
+    starting a new task or cancelling discards the result of the running one.
+    The task_buttons (those starting tasks) are disabled while a task runs, so
+    a result can only be discarded by cancelling."""
+    def __init__(self, window, status_variable, progress_bar, cancel_button, task_buttons=(), poll_ms=50):
+        self.window = window
+        self.status_variable = status_variable
+        self.progress_bar = progress_bar
+        self.cancel_button = cancel_button
+        self.task_buttons = task_buttons
+        self.poll_ms = poll_ms
+        self.results = queue.Queue()
+        self.job = 0
+        self.busy = False
+        self.polling = False
+        self.on_done = None
+
+    def start(self, description, task, on_done):
+        self.job += 1
+        self.on_done = on_done
+        self.busy = True
+        threading.Thread(target=self._run, args=(self.job, task), daemon=True).start()
+        self.status_variable.set(description)
+        self.progress_bar.start(10)
+        self.cancel_button.configure(state=NORMAL)
+        for button in self.task_buttons:
+            button.configure(state=DISABLED)
+        if not self.polling:
+            self.polling = True
+            self.window.after(self.poll_ms, self._poll)
+
+    def cancel(self):
+        self.job += 1
+        self._finish("Cancelled")
+
+    def _run(self, job, task):
+        try:
+            self.results.put((job, task(), None))
+        except Exception as error:
+            # Any failure has to reach the main loop to be shown to the user
+            self.results.put((job, None, error))
+
+    def _poll(self):
+        self.polling = False
+        while True:
+            try:
+                job, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if job != self.job:
+                continue
+            if error is not None:
+                self._finish("Failed: {}".format(error))
+            else:
+                self._finish("")
+                self.on_done(result)
+        if self.busy:
+            self.polling = True
+            self.window.after(self.poll_ms, self._poll)
+
+    def _finish(self, status):
+        self.busy = False
+        self.progress_bar.stop()
+        self.cancel_button.configure(state=DISABLED)
+        for button in self.task_buttons:
+            button.configure(state=NORMAL)
+        self.status_variable.set(status)
+
+
+def update_bars(axes, labels, heights):
+    """Update the bars of a plot in place, they are only replaced when the
+    number of bars changed"""
+    container = axes.containers[0] if axes.containers else None
+    if container is not None and len(container) == len(heights):
+        for bar, height in zip(container, heights):
+            bar.set_height(height)
+    else:
+        if container is not None:
+            container.remove()
+        axes.bar(range(len(heights)), heights, color=background_color)
+    axes.set_xticks(range(len(labels)), labels)
+    axes.relim()
+    axes.autoscale_view()
 
 
 def personal_api():
@@ -100,153 +180,335 @@ def personal_api():
     return api_key
 
 
-def create_stock_data():
-    global stock
+def read_api_key() -> str:
     try:
         with open("../StockValuation/personal_api.txt", 'r') as saved_api_file:
-            api_key = saved_api_file.read()
+            return saved_api_file.read()
     except FileNotFoundError:
         api_key = personal_api()
         with open("../StockValuation/personal_api.txt", 'w') as create_api_file:
             create_api_file.write(api_key.get())
-    stock = StockData(ticker_var.get(), api_key)
-    update_data_display(stock)
-
-
-def update_data_display(stock):
-    """Update the stock data display"""
-    def display_market_cap(market_cap):
-        """Helper function for displaying the market cap"""
-        if (market_cap == "") or (market_cap <= 1000000):
-            return market_cap
-        elif market_cap > 1000000000:
-            billions = market_cap / 1000000000
-            return "{:.2f}B".format(billions)
-        elif market_cap > 1000000:
-            millions = market_cap / 1000000
-            return "{:.2f}M".format(millions)
-
-    pe_var.set(stock.overview["PERatio"])
-    ps_var.set(stock.overview["PriceToSalesRatioTTM"])
-    pb_var.set(stock.overview["PriceToBookRatio"])
-    mc_var.set(display_market_cap(int(stock.overview["MarketCapitalization"])))
-    # Data parsing
-    revenue, fcf_margin, netprofit_margin, years = parse_statements(stock)
-
-    plot(revenue, fcf_margin, netprofit_margin, years)
-
-
-def analyze():
-    """Function executed when the analyze button is pushed"""
-    low_assumptions = Assumptions(yrs_variable.get(), float(rev_growth.low_var.get()),
-                                  float(profit_margin.low_var.get()), float(fcf_margin.low_var.get()),
-                                  float(p_e.low_var.get()), float(p_fcf.low_var.get()), float(desired_ror.low_var.get()))
-    high_assumptions = Assumptions(yrs_variable.get(), float(rev_growth.high_var.get()),
-                                   float(profit_margin.high_var.get()), float(fcf_margin.high_var.get()),
-                                   float(p_e.high_var.get()), float(p_fcf.high_var.get()), float(desired_ror.high_var.get()))
-    annual_revenue = int(stock.income_statement['annualReports'][0]['totalRevenue'])
-    shares_outst = int(stock.overview["SharesOutstanding"])
-    (low_intrinsic_fcf_val, low_intrinsic_profit_val) = low_assumptions.evaluate(annual_revenue, shares_outst)
-    (high_intrinsic_fcf_val, high_intrinsic_profit_val) = high_assumptions.evaluate(annual_revenue, shares_outst)
-    earnings_low_value.set("{:.2f} $".format(low_intrinsic_profit_val))
-    earnings_high_value.set("{:.2f} $".format(high_intrinsic_profit_val))
-    fcf_low_value.set("{:.2f} $".format(low_intrinsic_fcf_val))
-    fcf_high_value.set("{:.2f} $".format(high_intrinsic_fcf_val))
-
-
-# Set defaults for the UI
-background_color = "gray"
-
-# Initialize main tkinter window
-mainWindow = Tk()
-
-# Set up the dimensions and visuals
-# of the main window
-mainWindow.geometry("800x430")
-mainWindow.configure(background=background_color)
-mainWindow.title("Stock Initial Analysis")
-mainWindow['padx'] = 10
-mainWindow['pady'] = 10
-
-# Symbol input and stock fundamental data frame
-data_frame = Frame(mainWindow, relief="sunken", borderwidth=1, background=background_color)
-data_frame.grid(row=0, column=0, sticky="ew", columnspan=3, rowspan=1)
-
-# Input ticker symbol
-ticker_label = Label(data_frame, text="Symbol: ", background=background_color)
-ticker_label.grid(row=0, column=0)
-ticker_var = StringVar(mainWindow)
-ticker_entry = Entry(data_frame, textvariable=ticker_var, width=8)
-ticker_entry.grid(row=0, column=1, columnspan=2, sticky="w", padx=5)
-ticker_button = Button(data_frame, text="Get data", command=create_stock_data)
-ticker_button.grid(row=0, column=3, pady=4)
-
-# Stock fundamental data display
-pe_var = StringVar(mainWindow)
-data_display_line("P/E", data_frame, pe_var, 1, 0)
-ps_var = StringVar(mainWindow)
-data_display_line("P/S", data_frame, ps_var, 2, 0)
-pb_var = StringVar(mainWindow)
-data_display_line("P/B", data_frame, pb_var, 3, 0)
-mc_var = StringVar(mainWindow)
-data_display_line("Market Cap", data_frame, mc_var, 4, 0)
-
-# Assumptions
-assumptions_frame = LabelFrame(mainWindow, text="Valuation Assumptions",
-                               relief="sunken", borderwidth=1, background=background_color)
-assumptions_frame.grid(row=1, column=0, sticky="ew", columnspan=3, rowspan=1)
-
-low_label = Label(assumptions_frame, text="Low", background=background_color)
-low_label.grid(row=1, column=1)
-high_label = Label(assumptions_frame, text="High", background=background_color)
-high_label.grid(row=1, column=2)
-
-OPTIONS = [1, 2, 3, 4, 5,
-           6, 7, 8, 9, 10,
-           11, 12, 13, 14, 15,
-           16, 17, 18, 19, 20]
-yrs_variable = IntVar(assumptions_frame)
-yrs_variable.set(10) # default value
-yrs_for_analysis_label = Label(assumptions_frame, text="Years of analysis: ", background=background_color)
-yrs_for_analysis_label.grid(row=0, column=0)
-yrs_for_analysis = OptionMenu(assumptions_frame, yrs_variable, *OPTIONS)
-yrs_for_analysis.grid(row=0, column=1, columnspan=2)
-
-rev_growth = AssumptionLine("Annual Revenue Growth", assumptions_frame, 2, 0)
-profit_margin = AssumptionLine("Profit Margin", assumptions_frame, 3, 0)
-fcf_margin = AssumptionLine("FCF Margin", assumptions_frame, 4, 0)
-p_e = AssumptionLine("Future P/E", assumptions_frame, 5, 0)
-p_fcf = AssumptionLine("Future P/FCF", assumptions_frame, 6, 0)
-desired_ror = AssumptionLine("Desired ROR", assumptions_frame, 7, 0)
-
-analyze_button = Button(mainWindow, text="Analyze", command=analyze)
-analyze_button.grid(row=2, column=0, columnspan=3, sticky="ew", pady=4)
-
-# Fair value presentation
-fair_value_frame = LabelFrame(mainWindow, text="Fair Value",
-                              relief="sunken", borderwidth=1, background=background_color)
-fair_value_frame.grid(row=3, column=0, sticky="ew", columnspan=3, rowspan=1)
-
-earnings_low_value = Variable(fair_value_frame)
-earnings_low_value.set(0) # default value
-earnings_high_value = Variable(fair_value_frame)
-earnings_high_value.set(0) # default value
-earnings_label = Label(fair_value_frame, text="Discounted Earnings: ", background=background_color)
-earnings_label.grid(row=1, column=0)
-earnings_low_label = Label(fair_value_frame, textvariable=earnings_low_value, background=background_color)
-earnings_low_label.grid(row=1, column=1, sticky="ew")
-earnings_high_label = Label(fair_value_frame, textvariable=earnings_high_value, background=background_color)
-earnings_high_label.grid(row=1, column=2, sticky="ew")
-
-fcf_low_value = Variable(fair_value_frame)
-fcf_low_value.set(0) # default value
-fcf_high_value = Variable(fair_value_frame)
-fcf_high_value.set(0) # default value
-fcf_label = Label(fair_value_frame, text="Discounted Cash Flow: ", background=background_color)
-fcf_label.grid(row=2, column=0)
-fcf_low_label = Label(fair_value_frame, textvariable=fcf_low_value, background=background_color)
-fcf_low_label.grid(row=2, column=1, sticky="ew")
-fcf_high_label = Label(fair_value_frame, textvariable=fcf_high_value, background=background_color)
-fcf_high_label.grid(row=2, column=2, sticky="ew")
-
-mainWindow.mainloop()
+        return api_key.get()
+
+
+def fetch_stock(symbol, api_key):
+    """Runs in the background worker, no Tk calls allowed here. Missing exchange
+    rates fail here, with the command downloading them, instead of in the
+    valuation callbacks."""
+    stock_data = StockData(symbol, api_key)
+    return stock_data, historical_metrics.metrics_for_stock(stock_data), stock_data.trailing_twelve_months()
+
+
+def display_market_cap(market_cap):
+    """Helper function for displaying the market cap"""
+    if (market_cap == "") or (market_cap <= 1000000):
+        return market_cap
+    elif market_cap > 1000000000:
+        billions = market_cap / 1000000000
+        return "{:.2f}B".format(billions)
+    elif market_cap > 1000000:
+        millions = market_cap / 1000000
+        return "{:.2f}M".format(millions)
+
+
+class StockWindow(object):
+    """Main window: stock data, assumptions, fair values, sensitivity heatmap and
+    historic data. Call mainloop() to run it."""
+    def __init__(self, window=None):
+        self.stock = None
+        self.ttm_revenue = None
+        self.sensitivity_grid = None
+        self.sensitivity_base = None
+
+        # Initialize main tkinter window
+        self.window = mainWindow = window or Tk()
+
+        # Set up the dimensions and visuals
+        # of the main window
+        mainWindow.geometry("1250x570")
+        mainWindow.configure(background=background_color)
+        mainWindow.title("Stock Initial Analysis")
+        mainWindow['padx'] = 10
+        mainWindow['pady'] = 10
+
+        # Symbol input and stock fundamental data frame
+        data_frame = Frame(mainWindow, relief="sunken", borderwidth=1, background=background_color)
+        data_frame.grid(row=0, column=0, sticky="ew", columnspan=3, rowspan=1)
+
+        # Input ticker symbol
+        ticker_label = Label(data_frame, text="Symbol: ", background=background_color)
+        ticker_label.grid(row=0, column=0)
+        self.ticker_var = StringVar(mainWindow)
+        ticker_entry = Entry(data_frame, textvariable=self.ticker_var, width=8)
+        ticker_entry.grid(row=0, column=1, columnspan=2, sticky="w", padx=5)
+        ticker_button = Button(data_frame, text="Get data", command=self.create_stock_data)
+        ticker_button.grid(row=0, column=3, pady=4)
+
+        # Stock fundamental data display
+        self.pe_var = StringVar(mainWindow)
+        data_display_line("P/E", data_frame, self.pe_var, 1, 0)
+        self.ps_var = StringVar(mainWindow)
+        data_display_line("P/S", data_frame, self.ps_var, 2, 0)
+        self.pb_var = StringVar(mainWindow)
+        data_display_line("P/B", data_frame, self.pb_var, 3, 0)
+        self.mc_var = StringVar(mainWindow)
+        data_display_line("Market Cap", data_frame, self.mc_var, 4, 0)
+
+        # Assumptions
+        assumptions_frame = LabelFrame(mainWindow, text="Valuation Assumptions",
+                                       relief="sunken", borderwidth=1, background=background_color)
+        assumptions_frame.grid(row=1, column=0, sticky="ew", columnspan=3, rowspan=1)
+
+        low_label = Label(assumptions_frame, text="Low", background=background_color)
+        low_label.grid(row=1, column=1)
+        high_label = Label(assumptions_frame, text="High", background=background_color)
+        high_label.grid(row=1, column=2)
+
+        self.yrs_variable = IntVar(assumptions_frame)
+        self.yrs_variable.set(10) # default value
+        yrs_for_analysis_label = Label(assumptions_frame, text="Years of analysis: ", background=background_color)
+        yrs_for_analysis_label.grid(row=0, column=0)
+        yrs_for_analysis = OptionMenu(assumptions_frame, self.yrs_variable, *YEAR_OPTIONS)
+        yrs_for_analysis.grid(row=0, column=1, columnspan=2)
+
+        self.assumption_lines = {
+            'rev_growth': AssumptionLine("Annual Revenue Growth", assumptions_frame, 2, 0),
+            'profit_margin': AssumptionLine("Profit Margin", assumptions_frame, 3, 0),
+            'fcf_margin': AssumptionLine("FCF Margin", assumptions_frame, 4, 0),
+            'p_e': AssumptionLine("Future P/E", assumptions_frame, 5, 0),
+            'p_fcf': AssumptionLine("Future P/FCF", assumptions_frame, 6, 0),
+            'desired_ror': AssumptionLine("Desired ROR", assumptions_frame, 7, 0)}
+
+        analyze_button = Button(mainWindow, text="Analyze", command=self.analyze)
+        analyze_button.grid(row=2, column=0, columnspan=2, sticky="ew", pady=4)
+        monte_carlo_button = Button(mainWindow, text="Monte Carlo", command=self.run_monte_carlo)
+        monte_carlo_button.grid(row=2, column=2, sticky="ew", pady=4)
+
+        # Fair value presentation
+        fair_value_frame = LabelFrame(mainWindow, text="Fair Value",
+                                      relief="sunken", borderwidth=1, background=background_color)
+        fair_value_frame.grid(row=3, column=0, sticky="ew", columnspan=3, rowspan=1)
+
+        self.earnings_low_value = Variable(fair_value_frame)
+        self.earnings_low_value.set(0) # default value
+        self.earnings_high_value = Variable(fair_value_frame)
+        self.earnings_high_value.set(0) # default value
+        earnings_label = Label(fair_value_frame, text="Discounted Earnings: ", background=background_color)
+        earnings_label.grid(row=1, column=0)
+        earnings_low_label = Label(fair_value_frame, textvariable=self.earnings_low_value, background=background_color)
+        earnings_low_label.grid(row=1, column=1, sticky="ew")
+        earnings_high_label = Label(fair_value_frame, textvariable=self.earnings_high_value,
+                                    background=background_color)
+        earnings_high_label.grid(row=1, column=2, sticky="ew")
+
+        self.fcf_low_value = Variable(fair_value_frame)
+        self.fcf_low_value.set(0) # default value
+        self.fcf_high_value = Variable(fair_value_frame)
+        self.fcf_high_value.set(0) # default value
+        fcf_label = Label(fair_value_frame, text="Discounted Cash Flow: ", background=background_color)
+        fcf_label.grid(row=2, column=0)
+        fcf_low_label = Label(fair_value_frame, textvariable=self.fcf_low_value, background=background_color)
+        fcf_low_label.grid(row=2, column=1, sticky="ew")
+        fcf_high_label = Label(fair_value_frame, textvariable=self.fcf_high_value, background=background_color)
+        fcf_high_label.grid(row=2, column=2, sticky="ew")
+
+        # Monte Carlo percentiles (10th / 50th / 90th)
+        mc_label = Label(fair_value_frame, text="Monte Carlo P10 / P50 / P90", background=background_color)
+        mc_label.grid(row=3, column=0, columnspan=3)
+        self.earnings_mc_value = Variable(fair_value_frame)
+        earnings_mc_label = Label(fair_value_frame, text="Discounted Earnings: ", background=background_color)
+        earnings_mc_label.grid(row=4, column=0)
+        earnings_mc_value_label = Label(fair_value_frame, textvariable=self.earnings_mc_value,
+                                        background=background_color)
+        earnings_mc_value_label.grid(row=4, column=1, columnspan=2, sticky="ew")
+        self.fcf_mc_value = Variable(fair_value_frame)
+        fcf_mc_label = Label(fair_value_frame, text="Discounted Cash Flow: ", background=background_color)
+        fcf_mc_label.grid(row=5, column=0)
+        fcf_mc_value_label = Label(fair_value_frame, textvariable=self.fcf_mc_value, background=background_color)
+        fcf_mc_value_label.grid(row=5, column=1, columnspan=2, sticky="ew")
+
+        # Sensitivity of the fair value to two assumptions
+        sensitivity_frame = LabelFrame(mainWindow, text="Sensitivity",
+                                       relief="sunken", borderwidth=1, background=background_color)
+        sensitivity_frame.grid(row=4, column=0, sticky="ew", columnspan=3, rowspan=1)
+        self.row_axis_var = StringVar(sensitivity_frame)
+        self.row_axis_var.set("Revenue Growth") # default value
+        row_axis_menu = OptionMenu(sensitivity_frame, self.row_axis_var, *SENSITIVITY_AXES)
+        row_axis_menu.grid(row=0, column=0)
+        self.column_axis_var = StringVar(sensitivity_frame)
+        self.column_axis_var.set("Desired ROR") # default value
+        column_axis_menu = OptionMenu(sensitivity_frame, self.column_axis_var, *SENSITIVITY_AXES)
+        column_axis_menu.grid(row=0, column=1)
+        self.model_var = StringVar(sensitivity_frame)
+        self.model_var.set("FCF") # default value
+        model_menu = OptionMenu(sensitivity_frame, self.model_var, "FCF", "Earnings",
+                                command=lambda _: self.update_heatmap())
+        model_menu.grid(row=0, column=2)
+        sensitivity_button = Button(sensitivity_frame, text="Sensitivity", command=self.sensitivity)
+        sensitivity_button.grid(row=0, column=3, padx=4)
+
+        self._create_figures()
+
+        # Progress of background tasks
+        status_frame = Frame(mainWindow, background=background_color)
+        status_frame.grid(row=5, column=0, sticky="ew", columnspan=5)
+        status_var = StringVar(status_frame)
+        status_label = Label(status_frame, textvariable=status_var, background=background_color)
+        status_label.grid(row=0, column=0, sticky="w")
+        progress_bar = ttk.Progressbar(status_frame, mode='indeterminate', length=150)
+        progress_bar.grid(row=0, column=1, padx=5)
+        cancel_button = Button(status_frame, text="Cancel", state=DISABLED)
+        cancel_button.grid(row=0, column=2)
+        self.worker = BackgroundWorker(mainWindow, status_var, progress_bar, cancel_button,
+                                       (ticker_button, monte_carlo_button))
+        cancel_button.configure(command=self.worker.cancel)
+
+    def _create_figures(self):
+        # matplotlib takes longer to import than the rest of the program, only the window needs it
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        # The heatmap figure is created once and updated in place
+        heatmap_figure = Figure(figsize=(4, 4), layout='constrained', facecolor=background_color)
+        self.heatmap_axes = heatmap_figure.add_subplot(1, 1, 1)
+        self.heatmap_image = self.heatmap_axes.imshow(np.zeros((GRID_STEPS, GRID_STEPS)), origin='lower',
+                                                      aspect='auto')
+        heatmap_figure.colorbar(self.heatmap_image, ax=self.heatmap_axes)
+        self.heatmap_canvas = FigureCanvasTkAgg(heatmap_figure, master=self.window)
+        self.heatmap_canvas.get_tk_widget().grid(row=0, column=4, rowspan=5, padx=5)
+
+        # The historic data figure is created once and updated in place
+        history_figure = Figure(figsize=(4, 4), layout='constrained', facecolor=background_color)
+        self.history_axes = [history_figure.add_subplot(3, 1, index) for index in (1, 2, 3)]
+        for history_ax in self.history_axes:
+            history_ax.set_facecolor('#eafff5')
+        self.history_canvas = FigureCanvasTkAgg(history_figure, master=self.window)
+        self.history_canvas.get_tk_widget().grid(row=0, column=3, rowspan=5, padx=5)
+
+    def mainloop(self):
+        self.window.mainloop()
+
+    def plot(self, metrics):
+        """Show the historic data of a historical_metrics record (most recent year last)
+        in the figure created at start-up"""
+        with stats.stage('render'):
+            years = metrics['fiscal_year'][::-1]
+            update_bars(self.history_axes[0], years, metrics['revenue'][::-1])
+            update_bars(self.history_axes[1], years, metrics['fcf_margin'][::-1])
+            update_bars(self.history_axes[2], years, metrics['profit_margin'][::-1])
+            if stats.enabled:
+                # Draw now so the rendering time is part of the stage
+                self.history_canvas.draw()
+            else:
+                self.history_canvas.draw_idle()
+
+    def create_stock_data(self):
+        api_key = read_api_key()
+        symbol = self.ticker_var.get()
+        self.worker.start("Fetching {}...".format(symbol), lambda: fetch_stock(symbol, api_key), self.show_stock)
+
+    def show_stock(self, result):
+        self.stock, metrics, self.ttm_revenue = result
+        self.update_data_display(self.stock, metrics)
+
+    def update_data_display(self, stock, metrics):
+        """Update the stock data display"""
+        self.pe_var.set(stock.overview["PERatio"])
+        self.ps_var.set(stock.overview["PriceToSalesRatioTTM"])
+        self.pb_var.set(stock.overview["PriceToBookRatio"])
+        self.mc_var.set(display_market_cap(int(stock.overview["MarketCapitalization"])))
+        self.plot(metrics)
+
+    def read_assumptions(self):
+        """Low and high Assumptions from the assumption entries"""
+        def assumptions(value_of):
+            lines = self.assumption_lines
+            return Assumptions(self.yrs_variable.get(), float(value_of(lines['rev_growth']).get()),
+                               float(value_of(lines['profit_margin']).get()),
+                               float(value_of(lines['fcf_margin']).get()), float(value_of(lines['p_e']).get()),
+                               float(value_of(lines['p_fcf']).get()), float(value_of(lines['desired_ror']).get()))
+
+        return assumptions(lambda line: line.low_var), assumptions(lambda line: line.high_var)
+
+    def analyze(self):
+        """Function executed when the analyze button is pushed"""
+        low_assumptions, high_assumptions = self.read_assumptions()
+        ttm_revenue = self.ttm_revenue
+        shares_outst = int(self.stock.overview["SharesOutstanding"])
+        (low_intrinsic_fcf_val, low_intrinsic_profit_val) = low_assumptions.evaluate(ttm_revenue, shares_outst)
+        (high_intrinsic_fcf_val, high_intrinsic_profit_val) = high_assumptions.evaluate(ttm_revenue, shares_outst)
+        self.earnings_low_value.set("{:.2f} $".format(low_intrinsic_profit_val))
+        self.earnings_high_value.set("{:.2f} $".format(high_intrinsic_profit_val))
+        self.fcf_low_value.set("{:.2f} $".format(low_intrinsic_fcf_val))
+        self.fcf_high_value.set("{:.2f} $".format(high_intrinsic_fcf_val))
+
+    def run_monte_carlo(self):
+        """Function executed when the Monte Carlo button is pushed,
+        shows the 10th, 50th and 90th percentile of the fair value"""
+        low_assumptions, high_assumptions = self.read_assumptions()
+        ttm_revenue = self.ttm_revenue
+        shares_outst = int(self.stock.overview["SharesOutstanding"])
+        self.worker.start("Sampling...", lambda: simulate(low_assumptions, high_assumptions, ttm_revenue,
+                                                          shares_outst, n_paths=200000, seed=0,
+                                                          percentiles=(10, 50, 90)),
+                          self.show_monte_carlo)
+
+    def show_monte_carlo(self, result):
+        self.earnings_mc_value.set(" / ".join("{:.2f}".format(value) for value in result['profit']) + " $")
+        self.fcf_mc_value.set(" / ".join("{:.2f}".format(value) for value in result['fcf']) + " $")
+
+    def sensitivity(self):
+        """Function executed when the sensitivity button is pushed. The chosen
+        assumptions vary between their low and high values, the other assumptions
+        are held at their low values. Only rows/columns whose values changed since
+        the last push are recomputed."""
+        low_assumptions, _ = self.read_assumptions()
+        row_name = SENSITIVITY_AXES[self.row_axis_var.get()]
+        column_name = SENSITIVITY_AXES[self.column_axis_var.get()]
+        row_line = self.assumption_lines[row_name]
+        column_line = self.assumption_lines[column_name]
+        row_values = axis_values(float(row_line.low_var.get()), float(row_line.high_var.get()))
+        column_values = axis_values(float(column_line.low_var.get()), float(column_line.high_var.get()))
+        ttm_revenue = self.ttm_revenue
+        shares_outst = int(self.stock.overview["SharesOutstanding"])
+        base = (self.stock.symbol, low_assumptions.years_of_analysis) + tuple(
+            getattr(low_assumptions, name) for name in self.assumption_lines if name not in (row_name, column_name))
+
+        grid = self.sensitivity_grid
+        if (grid is None or (grid.row_name, grid.column_name) != (row_name, column_name)
+                or base != self.sensitivity_base):
+            self.sensitivity_grid = SensitivityGrid(low_assumptions, ttm_revenue, shares_outst,
+                                                    row_name, row_values, column_name, column_values)
+        else:
+            grid.set_row_values(row_values)
+            grid.set_column_values(column_values)
+        self.sensitivity_base = base
+        self.update_heatmap()
+
+    def update_heatmap(self):
+        """Show the sensitivity grid of the chosen model in the heatmap"""
+        grid = self.sensitivity_grid
+        if grid is None:
+            return
+        values = grid.fcf if self.model_var.get() == "FCF" else grid.profit
+        self.heatmap_image.set_data(values)
+        self.heatmap_image.set_extent((grid.column_values[0], grid.column_values[-1],
+                                       grid.row_values[0], grid.row_values[-1]))
+        self.heatmap_image.set_clim(np.nanmin(values), np.nanmax(values))
+        self.heatmap_axes.set_xlabel(self.column_axis_var.get())
+        self.heatmap_axes.set_ylabel(self.row_axis_var.get())
+        self.heatmap_axes.set_title("Fair price ({})".format(self.model_var.get()))
+        self.heatmap_canvas.draw_idle()
+
+
+def main():
+    # python gui.py --profile prints the time spent in each stage when the window is closed
+    if '--profile' in sys.argv:
+        stats.enable()
+    StockWindow().mainloop()
+    if stats.enabled:
+        stats.print_report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Historical metrics of N tickers x M fiscal years computed as array operations.
+Inputs are tickers x years arrays with the most recent year first (like
+FundamentalsStore.matrix) where missing values are NaN. The result is a
+structured array with one record per ticker, used by the terminal table and
+the GUI plots alike."""
+import numpy as np
+from fundamentals_store import FIELDS, annual_rows
+from instrumentation import stats
+
+
+def metrics_dtype(n_years: int) -> np.dtype:
+    return np.dtype([('fiscal_year', 'U4', (n_years,)),
+                     ('revenue', float, (n_years,)),
+                     ('free_cash_flow', float, (n_years,)),
+                     ('profit_margin', float, (n_years,)),
+                     ('fcf_margin', float, (n_years,)),
+                     # CAGR from j years ago to the most recent year, j = 1..M-1
+                     ('revenue_cagr', float, (n_years - 1,)),
+                     # Mean of the most recent 1..M years
+                     ('avg_profit_margin', float, (n_years,)),
+                     ('avg_fcf_margin', float, (n_years,)),
+                     # Mean over a moving window ending at each year
+                     ('rolling_profit_margin', float, (n_years,)),
+                     ('rolling_fcf_margin', float, (n_years,)),
+                     # Standard deviation of the year over year log revenue growth
+                     ('growth_stability', float)])
+
+
+def cumulative_mean(values):
+    """Mean of the first 1..M columns, NaN entries are left out"""
+    valid = ~np.isnan(values)
+    counts = np.cumsum(valid, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.cumsum(np.where(valid, values, 0), axis=1) / np.where(counts, counts, np.nan)
+
+
+def rolling_mean(values, window: int):
+    """Mean of each column and the window - 1 older (following) columns, NaN entries are left out"""
+    valid = ~np.isnan(values)
+    # Cumulative sums from the oldest year, padded with a zero column
+    sums = np.concatenate([np.zeros((len(values), 1)), np.cumsum(np.where(valid, values, 0)[:, ::-1], axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((len(values), 1)), np.cumsum(valid[:, ::-1], axis=1)], axis=1)
+    ends = np.arange(1, values.shape[1] + 1)
+    starts = np.maximum(ends - window, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums[:, ends] - sums[:, starts]) / (counts[:, ends] - counts[:, starts])
+    return means[:, ::-1]
+
+
+@stats.timed('metrics')
+def compute_metrics(revenue, net_income, operating_cash_flow, capital_expenditures,
+                    fiscal_year=None, window=3):
+    """
+    Metrics of all tickers at once.
+    :param revenue, net_income, operating_cash_flow, capital_expenditures:
+           tickers x years arrays, most recent year first, NaN when missing
+    :param fiscal_year: optional tickers x years array of year labels
+    :return: structured array of metrics_dtype, one record per ticker
+    """
+    revenue = np.atleast_2d(np.asarray(revenue, dtype=float))
+    net_income = np.atleast_2d(np.asarray(net_income, dtype=float))
+    free_cash_flow = (np.atleast_2d(np.asarray(operating_cash_flow, dtype=float))
+                      - np.atleast_2d(np.asarray(capital_expenditures, dtype=float)))
+    n_tickers, n_years = revenue.shape
+    metrics = np.zeros(n_tickers, dtype=metrics_dtype(n_years))
+    if fiscal_year is not None:
+        metrics['fiscal_year'] = fiscal_year
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profit_margin = net_income / revenue
+        fcf_margin = free_cash_flow / revenue
+        log_revenue = np.log(np.where(revenue > 0, revenue, np.nan))
+        years_back = np.arange(1, n_years)
+        metrics['revenue_cagr'] = np.expm1((log_revenue[:, :1] - log_revenue[:, 1:]) / years_back)
+        yearly_growth = log_revenue[:, :-1] - log_revenue[:, 1:]
+        valid_growth = (~np.isnan(yearly_growth)).sum(axis=1)
+        mean_growth = np.nansum(yearly_growth, axis=1) / valid_growth
+        metrics['growth_stability'] = np.sqrt(np.nansum((yearly_growth - mean_growth[:, np.newaxis]) ** 2, axis=1)
+                                              / (valid_growth - 1))
+    metrics['revenue'] = revenue
+    metrics['free_cash_flow'] = free_cash_flow
+    metrics['profit_margin'] = profit_margin
+    metrics['fcf_margin'] = fcf_margin
+    metrics['avg_profit_margin'] = cumulative_mean(profit_margin)
+    metrics['avg_fcf_margin'] = cumulative_mean(fcf_margin)
+    metrics['rolling_profit_margin'] = rolling_mean(profit_margin, window)
+    metrics['rolling_fcf_margin'] = rolling_mean(fcf_margin, window)
+    return metrics
+
+
+def metrics_from_store(store, n_years=5, window=3, start=0, stop=None):
+    """Metrics of the tickers in a FundamentalsStore, in the order of store.tickers.
+    start and stop select a range of tickers."""
+    stop = len(store) if stop is None else stop
+    offsets = store.offsets[start:stop + 1]
+    fiscal_year = np.full((stop - start, n_years), '', dtype='U4')
+    ticker_index = np.repeat(np.arange(stop - start), np.diff(offsets))
+    year_index = np.arange(offsets[0], offsets[-1]) - offsets[:-1][ticker_index]
+    keep = year_index < n_years
+    fiscal_year[ticker_index[keep], year_index[keep]] = store.fiscal_year[offsets[0]:offsets[-1]][keep]
+    return compute_metrics(*[store.matrix(field, n_years, start, stop)
+                             for field in ('totalRevenue', 'netIncome', 'operatingCashflow', 'capitalExpenditures')],
+                           fiscal_year=fiscal_year, window=window)
+
+
+def metrics_for_stock(stock, window=3):
+    """Metrics record of one StockData over all its annual reports"""
+    rows = annual_rows(stock)
+    if not rows:
+        raise ValueError("No annual reports for {}".format(stock.symbol))
+    columns = {field: np.array([[row[field] for _, row in rows]]) for field in FIELDS}
+    return compute_metrics(columns['totalRevenue'], columns['netIncome'],
+                           columns['operatingCashflow'], columns['capitalExpenditures'],
+                           [[fiscal_date[:4] for fiscal_date, _ in rows]], window)[0]
@@ -0,0 +1,197 @@
+"""Bulk ingestion of raw statements into compressed files on disk.
+Responses are streamed chunk by chunk into one gzip JSON lines file per
+function ({"symbol": ..., "data": <response>} per line), the decoded dicts are
+never held for the whole universe. Reading back decodes only the fields the
+valuation uses, one ticker at a time.
+Usage: python ingest.py tickers.txt raw_dir [--store store_dir]"""
+import argparse
+import functools
+import gzip
+import json
+import os
+import sys
+import threading
+import zlib
+from bulk_fetch import DailyQuotaExceeded, QuotaExceeded, TokenBucket, is_daily_quota_error, is_quota_error, \
+    iter_fetch, quota_message
+import data_sources
+from instrumentation import stats
+from response_cache import is_error_response
+from screen import read_tickers
+import stock_valuation
+from stock_valuation import STATEMENTS, StockData, get_api
+
+# Keys kept when decoding, at any depth of the response
+KEEP_FIELDS = {
+    'INCOME_STATEMENT': {'symbol', 'annualReports', 'quarterlyReports', 'fiscalDateEnding', 'reportedCurrency',
+                         'totalRevenue', 'netIncome'},
+    'CASH_FLOW': {'symbol', 'annualReports', 'quarterlyReports', 'fiscalDateEnding', 'reportedCurrency',
+                  'operatingCashflow', 'capitalExpenditures'},
+    'OVERVIEW': {'Symbol', 'Currency', 'LatestQuarter', 'SharesOutstanding', 'MarketCapitalization', 'PERatio',
+                 'PriceToSalesRatioTTM', 'PriceToBookRatio'}}
+# Error responses are a few hundred bytes, statements far larger
+SMALL_RESPONSE = 4096
+
+
+def records_path(directory: str, function: str) -> str:
+    return os.path.join(directory, function + '.jsonl.gz')
+
+
+class RecordFiles(object):
+    """One gzip file per function. Records of a ticker are appended to all files
+    at once, so every file lists the tickers in the same order."""
+    def __init__(self, directory: str, functions=STATEMENTS):
+        os.makedirs(directory, exist_ok=True)
+        self.files = {function: open(records_path(directory, function), 'wb') for function in functions}
+        self._lock = threading.Lock()
+
+    def append(self, members: dict):
+        """Append compressed records, a dict of function to gzip member"""
+        with self._lock:
+            for function, member in members.items():
+                self.files[function].write(member)
+
+    def close(self):
+        for records_file in self.files.values():
+            records_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compress_record(symbol: str, chunks) -> bytes:
+    """
+    Compress a streamed response into a gzip member holding one JSON line.
+    Newlines can only be whitespace in JSON, so they are blanked out without
+    decoding. Small responses are decoded to catch error messages.
+    :return: the member, or the decoded response when it is an error response
+    """
+    compressor = zlib.compressobj(wbits=31)
+    parts = [compressor.compress('{{"symbol": {}, "data": '.format(json.dumps(symbol)).encode())]
+    head = b''
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        chunk = chunk.replace(b'\n', b' ').replace(b'\r', b' ')
+        if size <= SMALL_RESPONSE:
+            head += chunk
+            continue
+        if head:
+            parts.append(compressor.compress(head))
+            head = b''
+        parts.append(compressor.compress(chunk))
+    if head:
+        data = json.loads(head)
+        if is_error_response(data):
+            return data
+        parts.append(compressor.compress(head))
+    parts.append(compressor.compress(b'}\n'))
+    parts.append(compressor.flush())
+    return b''.join(parts)
+
+
+def stream_statements(ticker_symbol, api_key, limiter, session=None, functions=STATEMENTS, cache=None,
+                      source=None, records=None, max_retries=5) -> int:
+    """
+    Stream all functions of one ticker into the record files, retrying requests
+    rejected by the quota. Called by bulk_fetch.iter_fetch, cache is unused.
+    :return: compressed size in bytes
+    """
+    source = source or stock_valuation.data_source
+    members = {}
+    for function in functions:
+        for _ in range(max_retries + 1):
+            if limiter is not None:
+                with stats.stage('rate_limit'):
+                    limiter.acquire()
+            with stats.stage('stream', function=function, symbol=ticker_symbol):
+                member = compress_record(ticker_symbol, source.fetch_raw(function, ticker_symbol, api_key, session))
+            if is_daily_quota_error(member):
+                raise DailyQuotaExceeded(quota_message(member))
+            if not is_quota_error(member):
+                break
+            if limiter is not None:
+                limiter.drain()
+        else:
+            raise QuotaExceeded("{} {} still rejected after {} retries".format(function, ticker_symbol,
+                                                                               max_retries))
+        if isinstance(member, dict):
+            raise ValueError("{} {}: {}".format(function, ticker_symbol, next(iter(member.values()))))
+        members[function] = member
+    records.append(members)
+    return sum(len(member) for member in members.values())
+
+
+def ingest(tickers, api_key, directory: str, functions=STATEMENTS, **fetch_options):
+    """
+    Stream the statements of the tickers into directory, replacing earlier files.
+    fetch_options are passed to bulk_fetch.iter_fetch (max_workers, limiter, source).
+    :return: generator of (ticker, compressed bytes or the raised exception)
+    """
+    with RecordFiles(directory, functions) as records:
+        yield from iter_fetch(tickers, api_key, functions=functions, cache=None,
+                              fetch=functools.partial(stream_statements, records=records), **fetch_options)
+
+
+def decode(function: str, line):
+    """Symbol and response of a record, keeping only the KEEP_FIELDS of the function"""
+    keep = KEEP_FIELDS.get(function)
+    if keep is None:
+        record = json.loads(line)
+    else:
+        keep = keep | {'symbol', 'data'}
+        record = json.loads(line, object_pairs_hook=lambda pairs: {key: value for key, value in pairs
+                                                                    if key in keep})
+    return record['symbol'], record['data']
+
+
+def iter_stocks(directory: str, functions=STATEMENTS):
+    """StockData of every ingested ticker, read one at a time"""
+    files = [gzip.open(records_path(directory, function), 'rb') for function in functions]
+    try:
+        for lines in zip(*files):
+            with stats.stage('decode'):
+                records = [decode(function, line) for function, line in zip(functions, lines)]
+            symbol = records[0][0]
+            if any(record_symbol != symbol for record_symbol, _ in records):
+                raise ValueError("The record files in {} are out of step at {}".format(directory, symbol))
+            yield StockData(symbol, payloads={function: data for function, (_, data) in zip(functions, records)})
+    finally:
+        for records_file in files:
+            records_file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream the statements of many tickers to compressed files.")
+    parser.add_argument('tickers', help="file with one ticker symbol per line")
+    parser.add_argument('directory', help="directory of the compressed files, replaced on every run")
+    parser.add_argument('--store', help="also build a fundamentals store (see refresh.py) in this directory")
+    parser.add_argument('--api-key', help="Alpha Vantage API key (default: the saved key)")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent fetches")
+    parser.add_argument('--calls-per-minute', type=int, default=5, help="API requests per minute")
+    parser.add_argument('--calls-per-day', type=int, help="API requests per day")
+    data_sources.add_arguments(parser)
+    args = parser.parse_args(argv)
+    source = data_sources.from_args(args)
+    api_key = args.api_key or ('replay' if args.replay else get_api())
+    limiter = TokenBucket(args.calls_per_minute, per_day=args.calls_per_day) if source.rate_limited else None
+    stored, size = 0, 0
+    for ticker, result in ingest(read_tickers(args.tickers), api_key, args.directory,
+                                 max_workers=args.workers, limiter=limiter, source=source):
+        if isinstance(result, Exception):
+            print("{} failed: {}".format(ticker, result), file=sys.stderr)
+        else:
+            stored += 1
+            size += result
+    print("Stored {} tickers in {} ({:.1f} MB compressed)".format(stored, args.directory, size / 1e6))
+    if args.store:
+        from fundamentals_store import FundamentalsStore
+        FundamentalsStore.from_stocks(iter_stocks(args.directory)).save(args.store)
+        print("Fundamentals store written to {}".format(args.store))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Built-in instrumentation of the fetch, parse, evaluate and render stages.
+Disabled by default, then every hook is a no-op. Enable with stats.enable()
+(or --profile on the command line) to collect per-stage timers, a request
+latency histogram, bytes downloaded, cache hit rates and peak memory, and
+optionally a JSON lines trace of every timed event."""
+import contextlib
+import functools
+import json
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then not reported
+    resource = None
+
+# Upper bounds of the request latency histogram buckets [ms]
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process [MB]"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class Stats(object):
+    def __init__(self):
+        self.enabled = False
+        self.trace = False
+        self._lock = threading.Lock()
+        # name -> cache, a cache watched under a taken name replaces the old one
+        self._caches = {}
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.latency_histogram = [0] * len(LATENCY_BUCKETS_MS)
+        self.requests = 0
+        self.bytes_downloaded = 0
+        self.events = []
+        self._started = time.perf_counter()
+
+    def enable(self, trace=False):
+        """Start collecting, with trace=True every timed event is kept for export_trace"""
+        self.enabled = True
+        self.trace = trace
+        self.reset()
+
+    def disable(self):
+        self.enabled = False
+
+    def watch_cache(self, cache, name=None):
+        """Report the hit rate of a cache with hits and misses counters"""
+        self._caches[name or type(cache).__name__] = cache
+
+    def unwatch_cache(self, cache):
+        """Stop reporting a cache passed to watch_cache"""
+        for name, watched in list(self._caches.items()):
+            if watched is cache:
+                del self._caches[name]
+
+    def stage(self, name: str, **details):
+        """Context manager timing a stage, details are added to the trace event"""
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(name, details)
+
+    def timed(self, name: str):
+        """Decorator timing every call of a function as a stage"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextlib.contextmanager
+    def _timed(self, name, details):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, start, details)
+
+    def add_time(self, name: str, seconds: float, start=None, details=None):
+        with self._lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            stage['count'] += 1
+            stage['total'] += seconds
+            stage['max'] = max(stage['max'], seconds)
+            if self.trace:
+                event = {'stage': name, 'start': (start or time.perf_counter()) - self._started,
+                         'duration': seconds, 'thread': threading.current_thread().name}
+                event.update(details or {})
+                self.events.append(event)
+
+    def record_request(self, seconds: float, n_bytes: int):
+        if not self.enabled:
+            return
+        milliseconds = seconds * 1000
+        bucket = next(index for index, bound in enumerate(LATENCY_BUCKETS_MS) if milliseconds <= bound)
+        with self._lock:
+            self.requests += 1
+            self.bytes_downloaded += n_bytes
+            self.latency_histogram[bucket] += 1
+
+    def report(self) -> dict:
+        caches = {}
+        for name, cache in list(self._caches.items()):
+            lookups = cache.hits + cache.misses
+            caches[name] = {'hits': cache.hits, 'misses': cache.misses,
+                            'hit_rate': cache.hits / lookups if lookups else None}
+        return {'wall_time': time.perf_counter() - self._started,
+                'stages': {name: dict(stage, mean=stage['total'] / stage['count'])
+                           for name, stage in self.stages.items()},
+                'requests': self.requests,
+                'bytes_downloaded': self.bytes_downloaded,
+                'latency_histogram_ms': {str(bound): count for bound, count
+                                         in zip(LATENCY_BUCKETS_MS, self.latency_histogram) if count},
+                'caches': caches,
+                'peak_rss_mb': peak_rss_mb()}
+
+    def print_report(self, file=sys.stderr):
+        report = self.report()
+        print('*' * 80, file=file)
+        print("Profile ({:.2f} s wall time)".format(report['wall_time']), file=file)
+        print("{:<12}{:>8}{:>12}{:>12}{:>12}".format("Stage", "Calls", "Total [s]", "Mean [ms]", "Max [ms]"),
+              file=file)
+        for name, stage in sorted(report['stages'].items(), key=lambda item: -item[1]['total']):
+            print("{:<12}{:>8}{:>12.3f}{:>12.3f}{:>12.3f}".format(name, stage['count'], stage['total'],
+                                                                  stage['mean'] * 1000, stage['max'] * 1000),
+                  file=file)
+        print("Requests: {}, downloaded {:.1f} kB".format(report['requests'], report['bytes_downloaded'] / 1024),
+              file=file)
+        for bound, count in report['latency_histogram_ms'].items():
+            print("  <= {:>6} ms: {}".format(bound, count), file=file)
+        for name, cache in report['caches'].items():
+            hit_rate = "-" if cache['hit_rate'] is None else "{:.0%}".format(cache['hit_rate'])
+            print("{}: {} hits, {} misses ({})".format(name, cache['hits'], cache['misses'], hit_rate), file=file)
+        if report['peak_rss_mb'] is not None:
+            print("Peak memory: {:.1f} MB".format(report['peak_rss_mb']), file=file)
+        print('*' * 80, file=file)
+
+    def export_trace(self, path: str):
+        """Write the trace events and the summary report as JSON lines"""
+        with open(path, 'w') as trace_file:
+            for event in self.events:
+                trace_file.write(json.dumps(event) + '\n')
+            trace_file.write(json.dumps(dict(self.report(), stage='summary')) + '\n')
+
+
+# Shared by all modules
+stats = Stats()
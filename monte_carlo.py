@@ -0,0 +1,109 @@
+"""Monte Carlo distribution of the fair value between the low and high assumptions.
+Every assumption (growth, margins, terminal multiples and discount rate) is
+sampled between its low and high value, optionally correlated through a
+Gaussian copula, and the paths are valued in fixed size chunks with
+discounted_value. The values of each chunk are only counted into a histogram
+between the lowest and highest possible value, so memory doesn't depend on
+the number of paths. The percentiles are read from the histogram, they are
+within a bin width (the value range / bins) of the exact ones."""
+import itertools
+import numpy as np
+from instrumentation import stats
+from stock_valuation import discounted_value
+
+# Order of the rows/columns of the correlation matrix
+ASSUMPTION_NAMES = ('rev_growth', 'profit_margin', 'fcf_margin', 'p_e', 'p_fcf', 'desired_ror')
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+
+def normal_cdf(z):
+    """Standard normal CDF (Abramowitz & Stegun 7.1.26, error below 1.5e-7)"""
+    x = np.abs(z) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * x)
+    polynomial = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1 - polynomial * np.exp(-x * x)
+    return 0.5 * (1 + np.sign(z) * erf)
+
+
+def triangular(u, low, high):
+    """Inverse CDF of the symmetric triangular distribution between low and high"""
+    width = high - low
+    return np.where(u < 0.5, low + width * np.sqrt(u / 2), high - width * np.sqrt((1 - u) / 2))
+
+
+def uniform(u, low, high):
+    return low + (high - low) * u
+
+
+DISTRIBUTIONS = {'triangular': triangular, 'uniform': uniform}
+
+
+def value_bounds(years, lows, highs, revenue, shares):
+    """Lowest and highest (FCF, profit) value over the assumptions between lows
+    and highs. The value is linear in the margins and the multiples and
+    monotonic in growth and rate of return, so the extremes are at corners."""
+    corners = np.array(list(itertools.product(*zip(lows, highs))))
+    values = np.array(discounted_value(years, *corners.T, revenue, shares))
+    return values.min(axis=1), values.max(axis=1)
+
+
+def histogram_percentiles(counts, low, high, percentiles):
+    """Percentiles of the values counted into equal bins between low and high,
+    the values of a bin are taken as evenly spread over it"""
+    if high <= low:
+        return np.full(len(percentiles), float(low))
+    cumulative = np.cumsum(counts)
+    ranks = np.asarray(percentiles, dtype=float) / 100 * (cumulative[-1] - 1)
+    bins = np.searchsorted(cumulative, ranks, side='right')
+    position = bins + (ranks - (cumulative[bins] - counts[bins]) + 0.5) / counts[bins]
+    return low + (high - low) * position / len(counts)
+
+
+@stats.timed('monte_carlo')
+def simulate(low_assumptions, high_assumptions, revenue, shares, n_paths=100000, seed=None,
+             correlation=None, distribution='triangular', chunk_size=65536, percentiles=PERCENTILES,
+             bins=65536) -> dict:
+    """
+    Sample n_paths scenarios and value each one.
+    :param bins: histogram bins between the lowest and highest value, sets the
+                 accuracy of the percentiles
+    :param correlation: optional 6x6 correlation matrix ordered like ASSUMPTION_NAMES
+    :param seed: seed of the random generator, the same seed gives the same result
+    :return: {'percentiles', 'fcf', 'profit'} where fcf and profit hold the
+             intrinsic value per share at each percentile
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError("Unknown distribution {!r}, use one of {}".format(distribution, list(DISTRIBUTIONS)))
+    sample = DISTRIBUTIONS[distribution]
+    lows = np.array([getattr(low_assumptions, name) for name in ASSUMPTION_NAMES], dtype=float)
+    highs = np.array([getattr(high_assumptions, name) for name in ASSUMPTION_NAMES], dtype=float)
+    lows, highs = np.minimum(lows, highs), np.maximum(lows, highs)
+    cholesky = None
+    if correlation is not None:
+        try:
+            cholesky = np.linalg.cholesky(np.asarray(correlation, dtype=float))
+        except np.linalg.LinAlgError:
+            raise ValueError("The correlation matrix must be symmetric positive definite")
+
+    rng = np.random.default_rng(seed)
+    years = low_assumptions.years_of_analysis
+    low_values, high_values = value_bounds(years, lows, highs, revenue, shares)
+    counts = np.zeros((2, bins), dtype=np.int64)
+    for start in range(0, n_paths, chunk_size):
+        stop = min(start + chunk_size, n_paths)
+        if cholesky is None:
+            u = rng.random((stop - start, len(ASSUMPTION_NAMES)))
+        else:
+            u = normal_cdf(rng.standard_normal((stop - start, len(ASSUMPTION_NAMES))) @ cholesky.T)
+        growth, prft_margin, fcf_mrgn, pe, pfcf, ror = sample(u, lows, highs).T
+        values = discounted_value(years, growth, prft_margin, fcf_mrgn, pe, pfcf, ror, revenue, shares)
+        for model, model_values in enumerate(values):
+            if high_values[model] > low_values[model]:
+                # Clipped against rounding at the bounds
+                position = (model_values - low_values[model]) * (bins / (high_values[model] - low_values[model]))
+                counts[model] += np.bincount(np.clip(position.astype(np.int64), 0, bins - 1), minlength=bins)
+            else:
+                counts[model, 0] += len(model_values)
+    fcf, profit = (histogram_percentiles(counts[model], low_values[model], high_values[model], percentiles)
+                   for model in range(2))
+    return {'percentiles': np.asarray(percentiles), 'fcf': fcf, 'profit': profit}
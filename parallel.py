@@ -0,0 +1,91 @@
+"""Value a large stored universe on all CPU cores.
+The tickers of a FundamentalsStore are split into shards handled by a process
+pool. Workers memory-map the saved store instead of receiving pickled
+statements, and write their historical metrics and valuations straight into
+shared memory arrays, so only (start, stop) ranges cross process boundaries.
+Every ticker is valued on its last annual revenue and shares outstanding under
+every scenario."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from fundamentals_store import FundamentalsStore
+from historical_metrics import metrics_dtype, metrics_from_store
+from stock_valuation import evaluate_batch
+
+# Columns of a scenarios array, in the units of Assumptions
+SCENARIO_COLUMNS = ('years', 'rev_growth', 'profit_margin', 'fcf_margin', 'pe', 'pfcf', 'ror')
+
+# State of a worker process, set by _init_worker
+_worker = {}
+
+
+def _attach(name: str, shape, dtype):
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _init_worker(store_directory, scenarios, n_years, values_spec, metrics_spec):
+    _worker['store'] = FundamentalsStore.load(store_directory, mmap=True)
+    _worker['scenarios'] = scenarios
+    _worker['n_years'] = n_years
+    _worker['values_memory'], _worker['values'] = _attach(*values_spec)
+    _worker['metrics_memory'], _worker['metrics'] = _attach(*metrics_spec)
+
+
+def _value_shard(bounds):
+    """Metrics and valuations of the tickers in [start, stop)"""
+    start, stop = bounds
+    store, scenarios = _worker['store'], _worker['scenarios']
+    metrics = metrics_from_store(store, _worker['n_years'], start=start, stop=stop)
+    revenue = metrics['revenue'][:, :1]
+    shares = store.shares_outstanding[start:stop, np.newaxis]
+    values = _worker['values']
+    values[start:stop, :, 0], values[start:stop, :, 1] = evaluate_batch(*scenarios.T, revenue, shares)
+    _worker['metrics'][start:stop] = metrics
+    return stop - start
+
+
+def value_universe(store_directory: str, scenarios, n_workers=None, shard_size=500, n_years=5):
+    """
+    Historical metrics and fair values of every ticker in a saved store.
+    :param scenarios: scenarios x 7 array, columns as in SCENARIO_COLUMNS
+    :param n_workers: worker processes, all cores by default, 1 runs in this process
+    :return: values (tickers x scenarios x [FCF, profit] fair value per share)
+             and metrics (historical_metrics record per ticker), both in the
+             order of the store's tickers
+    """
+    scenarios = np.atleast_2d(np.asarray(scenarios, dtype=float))
+    n_tickers = len(FundamentalsStore.load(store_directory, mmap=True))
+    n_workers = n_workers or os.cpu_count() or 1
+    shards = [(start, min(start + shard_size, n_tickers)) for start in range(0, n_tickers, shard_size)]
+    values_shape, dtype = (n_tickers, len(scenarios), 2), metrics_dtype(n_years)
+    values_memory = shared_memory.SharedMemory(create=True, size=max(int(np.prod(values_shape)) * 8, 1))
+    metrics_memory = shared_memory.SharedMemory(create=True, size=max(n_tickers * dtype.itemsize, 1))
+    try:
+        initargs = (store_directory, scenarios, n_years, (values_memory.name, values_shape, float),
+                    (metrics_memory.name, (n_tickers,), dtype))
+        if n_workers == 1:
+            _init_worker(*initargs)
+            try:
+                for shard in shards:
+                    _value_shard(shard)
+            finally:
+                _close_worker()
+        else:
+            with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=initargs) as executor:
+                for _ in executor.map(_value_shard, shards):
+                    pass
+        values = np.ndarray(values_shape, dtype=float, buffer=values_memory.buf).copy()
+        metrics = np.ndarray((n_tickers,), dtype=dtype, buffer=metrics_memory.buf).copy()
+    finally:
+        for memory in (values_memory, metrics_memory):
+            memory.close()
+            memory.unlink()
+    return values, metrics
+
+
+def _close_worker():
+    del _worker['values'], _worker['metrics']
+    _worker.pop('values_memory').close()
+    _worker.pop('metrics_memory').close()
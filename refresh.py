@@ -0,0 +1,118 @@
+"""Incremental refresh of a stored universe (see fundamentals_store.py).
+Only the overview of every ticker is fetched to compare its LatestQuarter with
+the one seen when the ticker was last fetched. The income and cash flow statements are
+fetched only for tickers that filed a new period (or aren't stored yet), and
+their reports are merged into the stored history. A nightly refresh therefore
+spends one request per unchanged ticker instead of three.
+Usage: python refresh.py store_dir [--add tickers.txt]"""
+import argparse
+import sys
+import numpy as np
+from bulk_fetch import TokenBucket, iter_fetch
+import data_sources
+from fundamentals_store import FundamentalsStore
+from instrumentation import stats
+from response_cache import is_error_response
+from stock_valuation import StockData, get_api, response_cache
+import stock_valuation
+
+SIGNAL = ('OVERVIEW',)
+# The balance sheet isn't used by the valuation
+STATEMENTS = ('INCOME_STATEMENT', 'CASH_FLOW')
+
+
+def changed_tickers(store, overviews: dict) -> list:
+    """Tickers whose LatestQuarter is newer than the one seen when they were last
+    fetched, or that aren't stored. Each announced quarter is fetched once, even
+    when the statements don't include it yet. Stores saved before the announced
+    quarter was kept compare with the latest period of the statements."""
+    changed = []
+    for ticker, overview in overviews.items():
+        reported = overview.get('LatestQuarter')
+        if ticker not in store:
+            changed.append(ticker)
+        elif reported and reported != 'None':
+            index = store.index(ticker)
+            stored = store.announced_quarter[index]
+            if np.isnat(stored):
+                stored = store.latest_quarter[index]
+            if np.isnat(stored) or np.datetime64(reported, 'D') > stored:
+                changed.append(ticker)
+    return changed
+
+
+def refresh(store, api_key, new_tickers=(), cache=response_cache, **fetch_options):
+    """
+    Refresh the store from the source.
+    :param new_tickers: tickers to add to the store
+    :param cache: cache of the statements, the overviews are always fetched
+    :param fetch_options: passed on to bulk_fetch.iter_fetch (max_workers, limiter, source)
+    :return: the merged store, list of refreshed tickers, dict of failed tickers and errors
+    """
+    if fetch_options.get('limiter') is None and (fetch_options.get('source')
+                                                  or stock_valuation.data_source).rate_limited:
+        # One bucket for both phases, the statements come out of the same quota as the overviews
+        fetch_options['limiter'] = TokenBucket()
+    tickers = store.tickers.tolist() + [ticker for ticker in new_tickers if ticker not in store]
+    failed = {}
+    overviews = {}
+    with stats.stage('refresh_signal'):
+        for ticker, result in iter_fetch(tickers, api_key, functions=SIGNAL, cache=None, **fetch_options):
+            if isinstance(result, Exception):
+                failed[ticker] = result
+            elif is_error_response(result['OVERVIEW']):
+                failed[ticker] = ValueError(result['OVERVIEW'])
+            else:
+                overviews[ticker] = result['OVERVIEW']
+    changed = changed_tickers(store, overviews)
+    if cache is not None:
+        # Cached statements predate the new filing
+        for ticker in changed:
+            for function in STATEMENTS:
+                cache.invalidate(function, ticker)
+    updates = []
+    with stats.stage('refresh_statements'):
+        for ticker, result in iter_fetch(changed, api_key, functions=STATEMENTS, cache=cache, **fetch_options):
+            if isinstance(result, Exception):
+                failed[ticker] = result
+                continue
+            errors = [data for data in result.values() if is_error_response(data)]
+            if errors:
+                failed[ticker] = ValueError(errors[0])
+                continue
+            updates.append(StockData(ticker, payloads=dict(result, OVERVIEW=overviews[ticker])))
+    return store.merge(updates), [stock.symbol for stock in updates], failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh a stored universe, fetching statements "
+                                                 "only for tickers that filed a new period.")
+    parser.add_argument('store', help="directory of the fundamentals store, created if missing")
+    parser.add_argument('--add', metavar='TICKERS', help="file with ticker symbols to add, one per line")
+    parser.add_argument('--api-key', help="Alpha Vantage API key (default: the saved key)")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent fetches")
+    parser.add_argument('--calls-per-minute', type=int, default=5, help="API requests per minute")
+    parser.add_argument('--calls-per-day', type=int, help="API requests per day")
+    data_sources.add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        store = FundamentalsStore.load(args.store, mmap=False)
+    except FileNotFoundError:
+        store = FundamentalsStore.from_stocks([])
+    new_tickers = []
+    if args.add:
+        with open(args.add, 'r') as tickers_file:
+            new_tickers = [line.strip().upper() for line in tickers_file if line.strip()]
+    source = data_sources.from_args(args)
+    api_key = args.api_key or ('replay' if args.replay else get_api())
+    limiter = TokenBucket(args.calls_per_minute, per_day=args.calls_per_day) if source.rate_limited else None
+    store, refreshed, failed = refresh(store, api_key, new_tickers, max_workers=args.workers, limiter=limiter,
+                                       source=source, cache=data_sources.cache_from_args(args, response_cache))
+    store.save(args.store)
+    print("{} tickers stored, {} refreshed, {} failed".format(len(store), len(refreshed), len(failed)))
+    for ticker, error in failed.items():
+        print("{}: {}".format(ticker, error))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""Persistent on-disk cache for Alpha Vantage responses.
+Entries are keyed by (function, symbol), expire after a per-function time to
+live and the least recently used entries are evicted when the size cap is hit.
+MemoryLRU is the in-memory counterpart used by the valuation service."""
+import atexit
+import heapq
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Fundamentals change quarterly, the overview (price ratios, market cap) daily
+DAY = 24 * 60 * 60
+DEFAULT_TTL = {'INCOME_STATEMENT': 30 * DAY,
+               'BALANCE_SHEET': 30 * DAY,
+               'CASH_FLOW': 30 * DAY,
+               'OVERVIEW': DAY}
+FALLBACK_TTL = DAY
+# Last-used times of hits are written with the index after this many hits
+SAVE_EVERY_HITS = 100
+# Eviction removes the least recently used entries down to this share of max_entries
+LOW_WATER = 0.9
+
+
+def is_error_response(data) -> bool:
+    """Alpha Vantage answers quota and symbol errors with a 200 and a message"""
+    return (not isinstance(data, dict) or not data
+            or any(key in data for key in ('Note', 'Information', 'Error Message')))
+
+
+class ResponseCache(object):
+    """Safe to share between threads, the index is only changed and written
+    under a lock and files are replaced atomically. Last-used times of hits
+    are saved every SAVE_EVERY_HITS hits and at exit."""
+    def __init__(self, directory="../StockValuation/cache", max_entries=1000, ttl=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = dict(DEFAULT_TTL if ttl is None else ttl)
+        self.hits = 0
+        self.misses = 0
+        self._index = None
+        # Hits since the index was last written
+        self._unsaved_hits = 0
+        # Reentrant, put and invalidate save while holding it
+        self._lock = threading.RLock()
+        atexit.register(self.close)
+
+    @property
+    def index(self) -> dict:
+        """Maps entry keys to [stored_at, last_used] times, loaded on first use"""
+        with self._lock:
+            if self._index is None:
+                try:
+                    with open(self._index_path(), 'r') as index_file:
+                        self._index = json.load(index_file)
+                except (FileNotFoundError, ValueError):
+                    self._index = {}
+            return self._index
+
+    def get(self, function: str, symbol: str):
+        """Return the cached response or None when missing or expired"""
+        key = self._key(function, symbol)
+        now = time.time()
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None or now - entry[0] > self.ttl.get(function, FALLBACK_TTL):
+                self.misses += 1
+                return None
+        try:
+            with open(self._entry_path(key), 'r') as entry_file:
+                data = json.load(entry_file)
+        except (FileNotFoundError, ValueError):
+            with self._lock:
+                self.index.pop(key, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            entry[1] = now
+            self.hits += 1
+            self._unsaved_hits += 1
+            if self._unsaved_hits >= SAVE_EVERY_HITS:
+                self.save()
+        return data
+
+    def put(self, function: str, symbol: str, data):
+        """Store a response, error responses are never cached"""
+        if is_error_response(data):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        key = self._key(function, symbol)
+        self._write(self._entry_path(key), data)
+        now = time.time()
+        with self._lock:
+            self.index[key] = [now, now]
+            self._evict()
+            self.save()
+
+    def invalidate(self, function: str, symbol: str):
+        """Drop an entry so the next lookup goes to the network"""
+        key = self._key(function, symbol)
+        with self._lock:
+            if key in self.index:
+                self._remove(key)
+                self.save()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self.index):
+                self._remove(key)
+            self.save()
+
+    def save(self):
+        """Write the index, last-used times of hits are flushed here"""
+        with self._lock:
+            if self._index is None or not os.path.isdir(self.directory):
+                return
+            self._write(self._index_path(), self._index)
+            self._unsaved_hits = 0
+
+    def close(self):
+        """Save the last-used times of hits not written yet, called at exit"""
+        with self._lock:
+            if self._unsaved_hits:
+                self.save()
+
+    @staticmethod
+    def _write(path, data):
+        """Write JSON to a temporary file and move it in place, readers never see half a file"""
+        temporary_path = "{}.{}.tmp".format(path, threading.get_ident())
+        with open(temporary_path, 'w') as temporary_file:
+            json.dump(data, temporary_file)
+        os.replace(temporary_path, path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'entries': len(self.index)}
+
+    def _evict(self):
+        """Remove the least recently used entries down to the low-water mark, so
+        the index is searched once per batch instead of on every put"""
+        if len(self.index) <= self.max_entries:
+            return
+        n_remove = len(self.index) - int(self.max_entries * LOW_WATER)
+        for key in heapq.nsmallest(n_remove, self.index, key=lambda k: self.index[k][1]):
+            self._remove(key)
+
+    def _remove(self, key):
+        del self.index[key]
+        try:
+            os.remove(self._entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _key(function, symbol):
+        return "{}_{}".format(function, symbol.upper())
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def _index_path(self):
+        return os.path.join(self.directory, "index.json")
+
+
+class MemoryLRU(object):
+    """Thread-safe in-memory LRU cache with an optional time to live [s]"""
+    def __init__(self, max_entries=1000, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self)}
@@ -0,0 +1,134 @@
+"""Reverse discounted cash flow: the revenue growth or rate of return the
+current price implies when the other assumptions are held fixed.
+The fair value depends on growth and rate of return only through the discount
+multiple q = (1 + growth) / (1 + ror),
+    price = revenue / shares * margin * (q + q^2 + ... + q^n + multiple * q^n)
+which increases with q, so there is one root for any positive price and
+margin. It is found for all elements at once by Newton steps kept inside a
+bracket, falling back to bisection when a step leaves it."""
+import numpy as np
+from instrumentation import stats
+from stock_valuation import discounted_value
+
+# Margin and terminal multiple of each model, as Assumptions attributes
+MODELS = {'fcf': ('fcf_margin', 'p_fcf'), 'profit': ('profit_margin', 'p_e')}
+
+
+def _value_and_slope(q, yrs, multiple, n_max):
+    """q + ... + q^n + multiple * q^n and its derivative, summed term by term
+    so it stays exact around q == 1"""
+    power = np.ones_like(q)
+    series = np.zeros_like(q)
+    slope = np.zeros_like(q)
+    for k in range(1, n_max + 1):
+        inside = k <= yrs
+        # power is q^(k-1) here
+        slope += np.where(inside, k * power, 0)
+        power = power * q
+        series += np.where(inside, power, 0)
+    terminal = q ** yrs
+    return series + multiple * terminal, slope + multiple * yrs * terminal / q
+
+
+def solve_discount_multiple(target, yrs, multiple, tol=1e-12, max_iter=100) -> dict:
+    """
+    Solve q + q^2 + ... + q^n + multiple * q^n = target for q > 0. All arguments
+    are broadcast against each other, yrs must be whole numbers.
+    :return: {'q', 'converged', 'iterations'}, q is NaN where there is no root
+             (target or multiple not positive, yrs below 1)
+    """
+    target, yrs, multiple = np.broadcast_arrays(np.asarray(target, dtype=float), np.asarray(yrs, dtype=int),
+                                                np.asarray(multiple, dtype=float))
+    shape = target.shape
+    target, yrs, multiple = target.ravel(), yrs.ravel(), multiple.ravel()
+    with np.errstate(invalid='ignore'):
+        valid = np.isfinite(target) & (target > 0) & (yrs >= 1) & (multiple >= 0)
+    q = np.full(target.shape, np.nan)
+    converged = np.zeros(target.shape, dtype=bool)
+    iterations = np.zeros(target.shape, dtype=int)
+    active = np.flatnonzero(valid)
+    n_max = int(yrs[active].max()) if active.size else 0
+    # The sum is at least (1 + multiple) * q^n for q >= 1, so the root lies below
+    # this bound. Newton steps on the increasing convex function starting above
+    # the root move down to it without overshooting, the bracket guards rounding.
+    low = np.zeros(active.size)
+    high = np.maximum(1, (target[active] / (1 + multiple[active])) ** (1 / yrs[active]))
+    q[active] = high
+    for iteration in range(1, max_iter + 1):
+        if not active.size:
+            break
+        q_active = q[active]
+        value, slope = _value_and_slope(q_active, yrs[active], multiple[active], n_max)
+        error = value - target[active]
+        above = error > 0
+        high = np.where(above, q_active, high)
+        low = np.where(above, low, q_active)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = q_active - error / slope
+        bisect = ~((step > low) & (step < high))
+        step[bisect] = (low[bisect] + high[bisect]) / 2
+        solved = np.abs(error) <= tol * target[active]
+        done = solved | (np.abs(step - q_active) <= tol * q_active)
+        q[active] = np.where(solved, q_active, step)
+        iterations[active] = iteration
+        converged[active[done]] = True
+        keep = ~done
+        active, low, high = active[keep], low[keep], high[keep]
+    return {'q': q.reshape(shape), 'converged': converged.reshape(shape), 'iterations': iterations.reshape(shape)}
+
+
+def _solve(price, assumptions, revenue, shares, model, tol, max_iter) -> dict:
+    if model not in MODELS:
+        raise ValueError("Unknown model {!r}, use one of {}".format(model, list(MODELS)))
+    margin_name, multiple_name = MODELS[model]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        target = price / (revenue / shares * getattr(assumptions, margin_name))
+    return solve_discount_multiple(target, assumptions.years_of_analysis, getattr(assumptions, multiple_name),
+                                   tol, max_iter)
+
+
+def _result(implied, solution, price, assumptions, revenue, shares, model, **solved) -> dict:
+    """Implied value in percent and the convergence diagnostics, the residual is
+    the relative price error of the forward model at the implied value"""
+    parameters = {name: getattr(assumptions, name) for name in
+                  ('rev_growth', 'profit_margin', 'fcf_margin', 'p_e', 'p_fcf', 'desired_ror')}
+    parameters.update(solved)
+    fair_values = dict(zip(MODELS, discounted_value(
+        assumptions.years_of_analysis, parameters['rev_growth'], parameters['profit_margin'],
+        parameters['fcf_margin'], parameters['p_e'], parameters['p_fcf'], parameters['desired_ror'],
+        revenue, shares)))
+    with np.errstate(invalid='ignore'):
+        residual = np.abs(fair_values[model] - price) / price
+    return {'implied': implied * 100,
+            'converged': solution['converged'],
+            'iterations': solution['iterations'],
+            'residual': residual}
+
+
+@stats.timed('reverse_dcf')
+def implied_growth(price, assumptions, revenue, shares, model='fcf', tol=1e-12, max_iter=100) -> dict:
+    """
+    Annual revenue growth that makes the fair value of the model ('fcf' or
+    'profit') equal to the price, the other values are taken from the
+    Assumptions (its rev_growth is ignored). price, revenue and shares may be
+    arrays, e.g. one element per ticker.
+    :return: {'implied', 'converged', 'iterations', 'residual'}, implied growth
+             in percent, NaN where no growth gives the price (e.g. negative margin)
+    """
+    price, revenue, shares = (np.asarray(values, dtype=float) for values in (price, revenue, shares))
+    solution = _solve(price, assumptions, revenue, shares, model, tol, max_iter)
+    growth = solution['q'] * (1 + assumptions.desired_ror) - 1
+    return _result(growth, solution, price, assumptions, revenue, shares, model, rev_growth=growth)
+
+
+@stats.timed('reverse_dcf')
+def implied_return(price, assumptions, revenue, shares, model='fcf', tol=1e-12, max_iter=100) -> dict:
+    """
+    Annual rate of return earned when buying at the price and the assumptions
+    come true, see implied_growth (here desired_ror is ignored).
+    :return: {'implied', 'converged', 'iterations', 'residual'}, implied return in percent
+    """
+    price, revenue, shares = (np.asarray(values, dtype=float) for values in (price, revenue, shares))
+    solution = _solve(price, assumptions, revenue, shares, model, tol, max_iter)
+    ror = (1 + assumptions.rev_growth) / solution['q'] - 1
+    return _result(ror, solution, price, assumptions, revenue, shares, model, desired_ror=ror)
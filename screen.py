@@ -0,0 +1,166 @@
+"""Value a whole universe of ticker symbols without interaction and rank them by
+margin of safety.
+Usage: python screen.py tickers.txt assumptions.json -o ranking.csv
+
+The tickers file has one symbol per line. The assumptions file holds the low
+(conservative) and high (optimistic) value of every assumption, like the GUI:
+    {"years": 10, "rev_growth": [5, 10], "profit_margin": [15, 20],
+     "fcf_margin": [12, 18], "pe": [15, 20], "pfcf": [15, 22], "ror": [12, 10]}
+Statements are fetched, parsed and valued one ticker at a time, only the result
+rows are kept, so memory doesn't grow with the size of the universe. The
+revenue growth the price implies (FCF model, other assumptions low) is solved
+for all tickers at once at the end."""
+import argparse
+import csv
+import json
+import math
+import sys
+from bulk_fetch import TokenBucket, iter_fetch
+from instrumentation import stats
+import data_sources
+from response_cache import is_error_response
+from reverse_dcf import implied_growth
+from stock_valuation import Assumptions, StockData, get_api, response_cache
+
+ASSUMPTIONS = ('rev_growth', 'profit_margin', 'fcf_margin', 'pe', 'pfcf', 'ror')
+COLUMNS = ['symbol', 'price', 'revenue', 'shares', 'low_fcf', 'low_profit', 'high_fcf', 'high_profit',
+           'margin_of_safety', 'implied_growth', 'error']
+
+
+def read_tickers(path: str) -> list:
+    with open(path, 'r') as tickers_file:
+        return [line.strip().upper() for line in tickers_file if line.strip() and not line.startswith('#')]
+
+
+def read_assumptions(path: str) -> (Assumptions, Assumptions):
+    """Low and high Assumptions from the assumptions file"""
+    with open(path, 'r') as assumptions_file:
+        values = json.load(assumptions_file)
+    low = Assumptions(int(values['years']), *[float(values[name][0]) for name in ASSUMPTIONS])
+    high = Assumptions(int(values['years']), *[float(values[name][1]) for name in ASSUMPTIONS])
+    return low, high
+
+
+def value_stock(stock, low_assumptions, high_assumptions) -> dict:
+    """Result row of one stock, the margin of safety is taken from the
+    conservative (low) fair value and is None when that isn't positive"""
+    revenue = stock.trailing_twelve_months()
+    shares = int(stock.overview['SharesOutstanding'])
+    price = int(stock.overview['MarketCapitalization']) / shares
+    low_fcf, low_profit = low_assumptions.evaluate(revenue, shares)
+    high_fcf, high_profit = high_assumptions.evaluate(revenue, shares)
+    fair_value = min(low_fcf, low_profit)
+    return {'symbol': stock.symbol,
+            'price': price,
+            'revenue': revenue,
+            'shares': shares,
+            'low_fcf': float(low_fcf),
+            'low_profit': float(low_profit),
+            'high_fcf': float(high_fcf),
+            'high_profit': float(high_profit),
+            'margin_of_safety': float((fair_value - price) / fair_value) if fair_value > 0 else None,
+            'implied_growth': None,
+            'error': ''}
+
+
+def screen(tickers, api_key, low_assumptions, high_assumptions, **fetch_options):
+    """Generator of result rows in the order the tickers finish fetching"""
+    for symbol, payloads in iter_fetch(tickers, api_key, **fetch_options):
+        if isinstance(payloads, Exception):
+            yield error_row(symbol, payloads)
+            continue
+        errors = [data for data in payloads.values() if is_error_response(data)]
+        if errors:
+            # The provider's message, e.g. for an unknown symbol
+            message = next(iter(errors[0].values()), None) if isinstance(errors[0], dict) else None
+            yield error_row(symbol, ValueError(message or "Empty response"))
+            continue
+        try:
+            yield value_stock(StockData(symbol, payloads=payloads), low_assumptions, high_assumptions)
+        except (KeyError, IndexError, ValueError, ZeroDivisionError) as error:
+            yield error_row(symbol, error)
+
+
+def error_row(symbol, error) -> dict:
+    row = dict.fromkeys(COLUMNS, None)
+    row.update(symbol=symbol, error="{}: {}".format(type(error).__name__, error))
+    return row
+
+
+def add_implied_growth(rows, assumptions) -> list:
+    """Fill in the revenue growth (percent) each price implies under the FCF model
+    with the other assumptions, None where no growth gives the price"""
+    valued = [row for row in rows if not row['error']]
+    if valued:
+        solution = implied_growth([row['price'] for row in valued], assumptions,
+                                  [row['revenue'] for row in valued], [row['shares'] for row in valued])
+        for row, growth, converged in zip(valued, solution['implied'].tolist(), solution['converged']):
+            row['implied_growth'] = growth if converged else None
+    return rows
+
+
+def rank(rows) -> list:
+    """Highest margin of safety first, then the stocks without one, failed tickers last"""
+    return sorted(rows, key=lambda row: (not row['error'], row['margin_of_safety'] is not None,
+                                         row['margin_of_safety'] or 0), reverse=True)
+
+
+def finite_or_none(value):
+    """NaN and infinity aren't valid JSON"""
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+
+def write_results(rows, path: str):
+    """Write CSV, or JSON when the file name ends with .json. Missing and
+    non-finite values are written as null (JSON) or left empty (CSV)."""
+    rows = [{column: finite_or_none(value) for column, value in row.items()} for row in rows]
+    if path.endswith('.json'):
+        with open(path, 'w') as results_file:
+            json.dump(rows, results_file, indent=1, allow_nan=False)
+        return
+    with open(path, 'w', newline='') as results_file:
+        writer = csv.DictWriter(results_file, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rank ticker symbols by margin of safety.")
+    parser.add_argument('tickers', help="file with one ticker symbol per line")
+    parser.add_argument('assumptions', help="JSON file with the low and high assumptions")
+    parser.add_argument('-o', '--output', default='ranking.csv', help="result file (.csv or .json)")
+    parser.add_argument('--api-key', help="Alpha Vantage API key (default: the saved key)")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent fetches")
+    parser.add_argument('--calls-per-minute', type=int, default=5, help="API requests per minute")
+    parser.add_argument('--calls-per-day', type=int, help="API requests per day")
+    parser.add_argument('--no-cache', action='store_true', help="always fetch from the network")
+    data_sources.add_arguments(parser)
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE',
+                        help="print the time spent in each stage, with a file name also "
+                             "write a JSON lines trace of every event")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile is not None:
+        stats.enable(trace=bool(args.profile))
+    low_assumptions, high_assumptions = read_assumptions(args.assumptions)
+    source = data_sources.from_args(args)
+    api_key = args.api_key or ('replay' if args.replay else get_api())
+    limiter = TokenBucket(args.calls_per_minute, per_day=args.calls_per_day) if source.rate_limited else None
+    rows = screen(read_tickers(args.tickers), api_key, low_assumptions, high_assumptions,
+                  max_workers=args.workers, limiter=limiter, source=source,
+                  cache=None if args.no_cache else data_sources.cache_from_args(args, response_cache))
+    ranking = add_implied_growth(rank(rows), low_assumptions)
+    write_results(ranking, args.output)
+    failed = sum(1 for row in ranking if row['error'])
+    print("Valued {} tickers, {} failed, results in {}".format(len(ranking) - failed, failed, args.output))
+    if args.profile is not None:
+        stats.print_report()
+    if args.profile:
+        stats.export_trace(args.profile)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Two-way sensitivity tables of the fair value.
+The full grid is valued in one broadcast pass of discounted_value. When the
+values of one axis change only the rows or columns with a value that wasn't on
+the axis before are recomputed, the others are kept (moved when their value
+moved to another position, e.g. when the axis is shifted)."""
+import numpy as np
+from stock_valuation import discounted_value
+
+# Assumptions attributes that can be put on an axis, axis values are given in
+# the same units as the Assumptions constructor (percent for these)
+AXES = ('rev_growth', 'profit_margin', 'fcf_margin', 'p_e', 'p_fcf', 'desired_ror')
+PERCENT_AXES = ('rev_growth', 'profit_margin', 'fcf_margin', 'desired_ror')
+
+
+def to_model_units(name: str, values):
+    values = np.asarray(values, dtype=float)
+    return values / 100 if name in PERCENT_AXES else values
+
+
+def previous_positions(old_values, new_values):
+    """Position of each new value among the old values, -1 for new ones"""
+    positions = {value: index for index, value in enumerate(old_values.tolist())}
+    return np.array([positions.get(value, -1) for value in new_values.tolist()], dtype=np.int64)
+
+
+class SensitivityGrid(object):
+    def __init__(self, assumptions, revenue, shares, row_name, row_values, column_name, column_values):
+        for name in (row_name, column_name):
+            if name not in AXES:
+                raise ValueError("Unknown axis {!r}, use one of {}".format(name, AXES))
+        if row_name == column_name:
+            raise ValueError("The rows and columns must vary different assumptions")
+        self.assumptions = assumptions
+        self.revenue = revenue
+        self.shares = shares
+        self.row_name = row_name
+        self.column_name = column_name
+        self.row_values = np.asarray(row_values, dtype=float)
+        self.column_values = np.asarray(column_values, dtype=float)
+        self.fcf = None
+        self.profit = None
+        self.recompute()
+
+    def _evaluate(self, row_values, column_values):
+        """Value the outer product of row and column values"""
+        parameters = {name: getattr(self.assumptions, name) for name in AXES}
+        parameters[self.row_name] = to_model_units(self.row_name, row_values)[:, np.newaxis]
+        parameters[self.column_name] = to_model_units(self.column_name, column_values)[np.newaxis, :]
+        fcf, profit = discounted_value(self.assumptions.years_of_analysis, parameters['rev_growth'],
+                                       parameters['profit_margin'], parameters['fcf_margin'],
+                                       parameters['p_e'], parameters['p_fcf'], parameters['desired_ror'],
+                                       self.revenue, self.shares)
+        shape = (len(row_values), len(column_values))
+        return np.broadcast_to(fcf, shape), np.broadcast_to(profit, shape)
+
+    def recompute(self):
+        """Value the whole grid"""
+        fcf, profit = self._evaluate(self.row_values, self.column_values)
+        self.fcf, self.profit = fcf.copy(), profit.copy()
+
+    def set_assumptions(self, assumptions, revenue=None, shares=None):
+        """The assumptions held fixed changed, every cell depends on them"""
+        self.assumptions = assumptions
+        self.revenue = self.revenue if revenue is None else revenue
+        self.shares = self.shares if shares is None else shares
+        self.recompute()
+
+    def set_row_values(self, values):
+        """
+        Change the row axis, only rows with a new value are recomputed.
+        :return: indices of the recomputed rows
+        """
+        values = np.asarray(values, dtype=float)
+        previous = previous_positions(self.row_values, values)
+        changed = np.flatnonzero(previous < 0)
+        kept = np.flatnonzero(previous >= 0)
+        fcf, profit = np.empty((2, len(values), len(self.column_values)))
+        fcf[kept], profit[kept] = self.fcf[previous[kept]], self.profit[previous[kept]]
+        self.row_values, self.fcf, self.profit = values, fcf, profit
+        if changed.size:
+            self.fcf[changed], self.profit[changed] = self._evaluate(values[changed], self.column_values)
+        return changed
+
+    def set_column_values(self, values):
+        """
+        Change the column axis, only columns with a new value are recomputed.
+        :return: indices of the recomputed columns
+        """
+        values = np.asarray(values, dtype=float)
+        previous = previous_positions(self.column_values, values)
+        changed = np.flatnonzero(previous < 0)
+        kept = np.flatnonzero(previous >= 0)
+        fcf, profit = np.empty((2, len(self.row_values), len(values)))
+        fcf[:, kept], profit[:, kept] = self.fcf[:, previous[kept]], self.profit[:, previous[kept]]
+        self.column_values, self.fcf, self.profit = values, fcf, profit
+        if changed.size:
+            self.fcf[:, changed], self.profit[:, changed] = self._evaluate(self.row_values, values[changed])
+        return changed
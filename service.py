@@ -0,0 +1,261 @@
+"""Long-running local valuation service with warm caches.
+Keeps the imports, the fundamentals of recently used tickers and recent
+valuation results in memory and answers over a local JSON HTTP API.
+Concurrent requests for a ticker that isn't loaded yet share a single
+upstream fetch.
+Usage: python service.py [--port 8080]
+
+    GET  /stock/IBM   key figures and historical metrics of a ticker
+    POST /evaluate    {"symbol": "IBM", "assumptions": {"years": 10, "rev_growth": 8,
+                       "profit_margin": 20, "fcf_margin": 18, "pe": 20, "pfcf": 25, "ror": 10}}
+                      or a list of such requests, answered in the same order
+    GET  /stats       cache hit rates and stage timers"""
+import argparse
+import json
+import re
+import threading
+import urllib.parse
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import data_sources
+from bulk_fetch import TokenBucket, fetch_statements, is_quota_error, make_session
+from historical_metrics import metrics_for_stock
+from instrumentation import stats
+from response_cache import MemoryLRU, is_error_response
+from stock_valuation import StockData, evaluate_batch, get_api, response_cache
+import stock_valuation
+
+ASSUMPTION_KEYS = ('years', 'rev_growth', 'profit_margin', 'fcf_margin', 'pe', 'pfcf', 'ror')
+DAY = 24 * 60 * 60
+# Ticker symbols reach the API URL and the cache file names
+SYMBOL = re.compile(r'[A-Z0-9.\-]{1,10}')
+
+
+class RequestError(Exception):
+    """Client error, answered with the given HTTP status"""
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Coalescer(object):
+    """Run a function once per key at a time, concurrent callers for the same
+    key wait for the running call and share its result"""
+    def __init__(self):
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, function):
+        with self._lock:
+            future = self._running.get(key)
+            leader = future is None
+            if leader:
+                future = self._running[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(function())
+        except Exception as error:
+            # Hand the failure to every waiting caller
+            future.set_exception(error)
+        finally:
+            with self._lock:
+                del self._running[key]
+        return future.result()
+
+
+class ValuationService(object):
+    def __init__(self, api_key, source=None, cache=response_cache, limiter=None,
+                 max_tickers=5000, max_results=100000):
+        self.api_key = api_key
+        self.source = source
+        self.cache = cache
+        if limiter is None and (source or stock_valuation.data_source).rate_limited:
+            limiter = TokenBucket()
+        self.limiter = limiter
+        self.session = make_session(16) if (source or stock_valuation.data_source).remote else None
+        # The overview (price, shares) changes daily
+        self.fundamentals = MemoryLRU(max_tickers, ttl=DAY)
+        self.results = MemoryLRU(max_results, ttl=DAY)
+        self.coalescer = Coalescer()
+        stats.watch_cache(self.fundamentals, 'fundamentals')
+        stats.watch_cache(self.results, 'results')
+
+    def stock(self, symbol: str) -> dict:
+        """Key figures of a ticker, fetched once and kept in memory"""
+        symbol = check_symbol(symbol)
+        entry = self.fundamentals.get(symbol)
+        if entry is None:
+            # Looked up again by the leader, the previous leader may have just loaded it
+            entry = self.coalescer.run(symbol, lambda: self.fundamentals.get(symbol) or self._load(symbol))
+        return entry
+
+    def _load(self, symbol: str) -> dict:
+        with stats.stage('service_load', symbol=symbol):
+            payloads = fetch_statements(symbol, self.api_key, self.limiter, self.session,
+                                        cache=self.cache, source=self.source)
+            for data in payloads.values():
+                if is_quota_error(data):
+                    raise RequestError(503, "API quota exceeded, try again later")
+                if is_error_response(data):
+                    raise RequestError(404, "Unknown symbol {}".format(symbol))
+            stock = StockData(symbol, self.api_key, payloads=payloads,
+                              source=self.source or stock_valuation.data_source, cache=self.cache)
+            try:
+                metrics = metrics_for_stock(stock)
+            except ValueError as error:
+                raise RequestError(404, str(error))
+            shares = int(stock.overview['SharesOutstanding'])
+            entry = {'symbol': symbol,
+                     'currency': stock.overview.get('Currency'),
+                     'price': int(stock.overview['MarketCapitalization']) / shares,
+                     'shares_outstanding': shares,
+                     'ttm_revenue': stock.trailing_twelve_months(),
+                     'pe_ratio': stock.overview.get('PERatio'),
+                     'metrics': {name: to_json(metrics[name]) for name in metrics.dtype.names}}
+        self.fundamentals.put(symbol, entry)
+        return entry
+
+    def evaluate(self, requests: list) -> list:
+        """Fair values of a batch of {"symbol", "assumptions"} requests, the
+        uncached ones of each ticker are valued in one evaluate_batch call"""
+        results = [None] * len(requests)
+        pending = {}
+        for index, request in enumerate(requests):
+            symbol, scenario = parse_request(request)
+            cached = self.results.get((symbol, scenario))
+            if cached is None:
+                pending.setdefault(symbol, []).append((index, scenario))
+            else:
+                results[index] = cached
+        for symbol, items in pending.items():
+            stock = self.stock(symbol)
+            scenarios = np.array([scenario for _, scenario in items], dtype=float)
+            fcf, profit = evaluate_batch(*scenarios.T, stock['ttm_revenue'], stock['shares_outstanding'])
+            for (index, scenario), fcf_value, profit_value in zip(items, fcf, profit):
+                result = {'symbol': symbol, 'price': stock['price'],
+                          'fair_value_fcf': float(fcf_value), 'fair_value_profit': float(profit_value)}
+                self.results.put((symbol, scenario), result)
+                results[index] = result
+        return results
+
+    def status(self) -> dict:
+        return dict(stats.report(), fundamentals=self.fundamentals.stats(), results=self.results.stats())
+
+    def close(self):
+        """Stop reporting the caches in the stats and close the HTTP session"""
+        stats.unwatch_cache(self.fundamentals)
+        stats.unwatch_cache(self.results)
+        if self.session is not None:
+            self.session.close()
+
+
+def check_symbol(symbol: str) -> str:
+    """The symbol in upper case, RequestError when it isn't a ticker symbol"""
+    symbol = symbol.upper()
+    if not SYMBOL.fullmatch(symbol):
+        raise RequestError(400, "Invalid ticker symbol {!r}".format(symbol))
+    return symbol
+
+
+def parse_request(request) -> (str, tuple):
+    try:
+        assumptions = request['assumptions']
+        scenario = tuple(float(assumptions[key]) for key in ASSUMPTION_KEYS)
+        symbol = str(request['symbol'])
+    except (KeyError, TypeError, ValueError) as error:
+        raise RequestError(400, "Each request needs a symbol and the assumptions {} ({})".format(
+            ', '.join(ASSUMPTION_KEYS), error))
+    return check_symbol(symbol), scenario
+
+
+def to_json(values):
+    """NaN isn't valid JSON, send null instead"""
+    if np.ndim(values) == 0:
+        return None if values != values else values.item()
+    return [None if value != value else value for value in np.asarray(values).tolist()]
+
+
+def make_handler(service):
+    class ServiceHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            path = urllib.parse.urlsplit(self.path).path
+            if path.startswith('/stock/'):
+                self._answer(lambda: service.stock(urllib.parse.unquote(path[len('/stock/'):])))
+            elif path == '/stats':
+                self._answer(service.status)
+            else:
+                self._send(404, {'error': "Unknown path {}".format(self.path)})
+
+        def do_POST(self):
+            if urllib.parse.urlsplit(self.path).path != '/evaluate':
+                self._send(404, {'error': "Unknown path {}".format(self.path)})
+                return
+            self._answer(self._evaluate)
+
+        def _evaluate(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            except ValueError:
+                raise RequestError(400, "The body must be JSON")
+            if isinstance(body, list):
+                return service.evaluate(body)
+            return service.evaluate([body])[0]
+
+        def _answer(self, function):
+            try:
+                self._send(200, function())
+            except RequestError as error:
+                self._send(error.status, {'error': str(error)})
+            except Exception as error:
+                # Keep serving, e.g. after a network error or an incomplete overview
+                self._send(500, {'error': "{}: {}".format(type(error).__name__, error)})
+
+        def _send(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return ServiceHandler
+
+
+def serve(service, host='127.0.0.1', port=8080) -> ThreadingHTTPServer:
+    """Start the HTTP server in a background thread, stop it with server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.url = 'http://{}:{}'.format(*server.server_address[:2])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local valuation service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--api-key', help="Alpha Vantage API key (default: the saved key)")
+    parser.add_argument('--profile', action='store_true', help="collect stage timers, shown by GET /stats")
+    data_sources.add_arguments(parser)
+    args = parser.parse_args()
+    if args.profile:
+        stats.enable()
+    valuation_service = ValuationService(args.api_key or ('replay' if args.replay else get_api()),
+                                         source=data_sources.from_args(args),
+                                         cache=data_sources.cache_from_args(args, response_cache))
+    server = serve(valuation_service, args.host, args.port)
+    print("Serving at {}, press Ctrl+C to stop".format(server.url))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()
+        valuation_service.close()
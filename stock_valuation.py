@@ -1,7 +1,22 @@
 """Before running the program you must receive an API key from
  https://www.alphavantage.co/support/#api-key"""
-import requests
 import numpy as np
+from response_cache import ResponseCache
+from data_sources import AlphaVantageSource
+import fx_rates
+import historical_metrics
+from fundamentals_store import annual_rows
+from instrumentation import stats
+
+# Fetched for every stock, the valuation doesn't use the balance sheet so it is
+# only fetched when StockData.balance_sheet is read
+STATEMENTS = ('INCOME_STATEMENT', 'CASH_FLOW', 'OVERVIEW')
+
+# Shared by the terminal program and the GUI so repeated lookups skip the network
+response_cache = ResponseCache()
+stats.watch_cache(response_cache)
+# Replace with a data_sources.RecordingSource or ReplaySource to record or replay responses
+data_source = AlphaVantageSource()
 
 
 class Assumptions(object):
@@ -20,19 +35,50 @@ class Assumptions(object):
 
     def evaluate(self, revenue, shares):
         """Evaluation of fair stock price based on the input assumptions"""
-        discount_multiple = (1 + self.rev_growth)/(1 + self.desired_ror)
-        yrs = np.arange(self.years_of_analysis) + np.ones(self.years_of_analysis)
-        dcf_arr = (revenue * self.fcf_margin) * discount_multiple ** yrs
-        dcf = dcf_arr.sum()
-        discounted_profit_arr = (revenue * self.profit_margin) * discount_multiple ** yrs
-        discounted_profit = discounted_profit_arr.sum()
-        terminal_fcf_value = self.p_fcf * (revenue * self.fcf_margin) * discount_multiple ** self.years_of_analysis
-        terminal_prft_value = self.p_e * (revenue * self.profit_margin) * discount_multiple ** self.years_of_analysis
-        ev_fcf = dcf + terminal_fcf_value
-        ev_profit = discounted_profit + terminal_prft_value
-        intrinsic_fcf = ev_fcf / shares
-        intrinsic_profit = ev_profit / shares
-        return intrinsic_fcf, intrinsic_profit
+        with stats.stage('evaluate'):
+            return discounted_value(self.years_of_analysis, self.rev_growth, self.profit_margin,
+                                    self.fcf_margin, self.p_e, self.p_fcf, self.desired_ror,
+                                    revenue, shares)
+
+
+def discounted_value(yrs, growth, prft_margin, fcf_mrgn, pe, pfcf, ror, revenue, shares):
+    """
+    Closed form of the discounted cash flow and earnings model.
+    Growth, margins and rate of return are decimal fractions. All arguments
+    may be scalars or arrays of matching (broadcastable) shape.
+    :return: intrinsic_fcf, intrinsic_profit (per share)
+    """
+    # q - 1 from the difference of the rates, so it keeps full precision when q is close to 1
+    excess = (growth - ror) / (1 + ror)
+    discount_multiple = 1 + excess
+    terminal_growth = np.expm1(yrs * np.log1p(excess))
+    terminal_multiple = 1 + terminal_growth
+    # Geometric series q + q^2 + ... + q^n = q (q^n - 1) / (q - 1), equal to n when q == 1
+    flat = excess == 0
+    series_sum = np.where(flat, yrs, discount_multiple * terminal_growth / np.where(flat, 1, excess))
+    per_share_revenue = revenue / shares
+    intrinsic_fcf = per_share_revenue * fcf_mrgn * (series_sum + pfcf * terminal_multiple)
+    intrinsic_profit = per_share_revenue * prft_margin * (series_sum + pe * terminal_multiple)
+    return intrinsic_fcf[()], intrinsic_profit[()]
+
+
+def evaluate_batch(yrs_of_analysis, rev_grwth, prft_margin, fcf_mrgn, pe, pfcf, ror, revenue, shares):
+    """
+    Vectorized version of Assumptions.evaluate, one array element per scenario/ticker.
+    Inputs are given in the same units as Assumptions (percent for growth,
+    margins and rate of return) and are broadcast against each other.
+    :return: intrinsic_fcf, intrinsic_profit arrays
+    """
+    with stats.stage('evaluate'):
+        return discounted_value(np.asarray(yrs_of_analysis),
+                                np.asarray(rev_grwth, dtype=float) / 100,
+                                np.asarray(prft_margin, dtype=float) / 100,
+                                np.asarray(fcf_mrgn, dtype=float) / 100,
+                                np.asarray(pe, dtype=float),
+                                np.asarray(pfcf, dtype=float),
+                                np.asarray(ror, dtype=float) / 100,
+                                np.asarray(revenue, dtype=float),
+                                np.asarray(shares, dtype=float))
 
 
 def print_fair_price(intrinsic_fcf, intrinsic_profit):
@@ -42,35 +88,83 @@ def print_fair_price(intrinsic_fcf, intrinsic_profit):
 
 
 class StockData(object):
-    def __init__(self, ticker_symbol='IBM', api='demo'):
+    def __init__(self, ticker_symbol='IBM', api='demo', payloads=None, source=None, cache=response_cache):
+        """Fetch the statements, or take them from payloads (dict keyed by function)
+        when they were already fetched, e.g. by bulk_fetch. Statements missing
+        from payloads are left empty, except for the balance sheet which is
+        fetched like the others when it is first read.
+        :param source: data_sources.DataSource, data_source by default. Without
+                       it the balance sheet of a stock built from payloads can't
+                       be fetched, the payloads may come from another source.
+        :param cache: response cache, see fetch_data"""
+        if payloads is None:
+            payloads = {function: fetch_data(function, ticker_symbol, api, cache, source=source)
+                        for function in STATEMENTS}
+            source = source or data_source
         self.symbol = ticker_symbol
-        self.income_statement = fetch_data('INCOME_STATEMENT', ticker_symbol, api)
-        self.balance_sheet = fetch_data('BALANCE_SHEET', ticker_symbol, api)
-        self.cash_flow = fetch_data('CASH_FLOW', ticker_symbol, api)
-        self.overview = fetch_data('OVERVIEW', ticker_symbol, api)
+        self.api = api
+        self.source = source
+        self.cache = cache
+        self.income_statement = payloads.get('INCOME_STATEMENT', {})
+        self._balance_sheet = payloads.get('BALANCE_SHEET')
+        self.cash_flow = payloads.get('CASH_FLOW', {})
+        self.overview = payloads.get('OVERVIEW', {})
         # self.currency = self.overview['Currency']
 
-    def trailing_twelve_months(self):
-        qurterly = [[q_report['reportedCurrency'], q_report['totalRevenue']]
-                    for q_report in self.income_statement['quarterlyReports']]
-        print(qurterly)
-
-        if qurterly[0][0] != 'USD':
-            url = 'https://api.exchangerate.host/convert?from={0}&to=USD'.format(qurterly[0][0])
-            response = requests.get(url)
-            currency_data = response.json()
-            print(currency_data)
+    @property
+    def balance_sheet(self) -> dict:
+        if self._balance_sheet is None:
+            if self.source is None:
+                raise ValueError("The balance sheet of {} wasn't in the payloads and the stock has no source to "
+                                 "fetch it from".format(self.symbol))
+            self._balance_sheet = fetch_data('BALANCE_SHEET', self.symbol, self.api, self.cache,
+                                             source=self.source)
+        return self._balance_sheet
+
+    def trailing_twelve_months(self, fx_table=None) -> float:
+        """
+        Revenue of the last four quarters in USD, each quarter converted at the
+        rate of its fiscal date end. Falls back to the last annual revenue when
+        fewer than four quarters are reported.
+        :param fx_table: fx_rates.FxRateTable, the table in fx_rates.FX_RATES_FILE by default
+        """
+        fx_table = fx_table or fx_rates.default_table()
+        quarterly = sorted(self.income_statement.get('quarterlyReports', []),
+                           key=lambda q_report: q_report['fiscalDateEnding'], reverse=True)[:4]
+        try:
+            if len(quarterly) == 4:
+                return sum(fx_table.to_usd(int(q_report['totalRevenue']), q_report['reportedCurrency'],
+                                           q_report['fiscalDateEnding'])
+                           for q_report in quarterly)
+        except ValueError:
+            # A quarter without revenue ('None'), use the annual report
+            pass
+        annual_report = self.income_statement['annualReports'][0]
+        return fx_table.to_usd(int(annual_report['totalRevenue']), annual_report['reportedCurrency'],
+                               annual_report['fiscalDateEnding'])
 
 
-def fetch_data(data_type='INCOME_STATEMENT', ticker_symbol='IBM', api_key='demo'):
+def fetch_data(data_type='INCOME_STATEMENT', ticker_symbol='IBM', api_key='demo', cache=response_cache,
+               session=None, limiter=None, source=None):
     """
-    Get data in json format from url at alphavantage.co.
+    Get data in json format from url at alphavantage.co, or from another data source.
+    Responses are served from the cache when fresh, pass cache=None to bypass it.
+    A requests.Session can be passed to reuse connections and a rate limiter
+    (bulk_fetch.TokenBucket) is waited on before every request to the source.
     :return: json_data:
     """
-    url = 'https://www.alphavantage.co/query?function={}&symbol={}&apikey={}'
-    json_data_source = url.format(data_type, ticker_symbol, api_key)
-    requested_data = requests.get(json_data_source)
-    return requested_data.json()
+    with stats.stage('fetch', function=data_type, symbol=ticker_symbol):
+        if cache is not None:
+            json_data = cache.get(data_type, ticker_symbol)
+            if json_data is not None:
+                return json_data
+        if limiter is not None:
+            with stats.stage('rate_limit'):
+                limiter.acquire()
+        json_data = (source or data_source).fetch(data_type, ticker_symbol, api_key, session)
+        if cache is not None:
+            cache.put(data_type, ticker_symbol, json_data)
+        return json_data
 
 
 def get_api() -> str:
@@ -119,96 +213,69 @@ def get_number(prompt: str) -> float:
             print("Enter a valid number, please try again.")
 
 
-def single_attribute_list_generator(attribute: str, statement: dict, years: list) -> list:
-    annual_list = [(int(statement[yr][attribute])) for yr in years]
-    return annual_list
-
-
-def calculate_margins(bottom_line: list, top_line: list) -> list:
-    """"""
-    margin = [bottom_line[ii]/top_line[ii] for ii in range(len(bottom_line))]
-    return margin
-
-
 def parse_statements(stock):
-    # Create income and cash flow statement dictionary keys are years
-    # - for each year a dictionary of the statement is stored
-    annual_income_statement = {}
-    annual_cash_flow_statement = {}
-    years = []
-    for index, report in enumerate(stock.income_statement['annualReports']):
-        year = report['fiscalDateEnding'][:4]
-        years.append(year)
-        annual_income_statement[year] = report
-        annual_cash_flow_statement[year] = stock.cash_flow['annualReports'][index]
-
-    revenue_list = single_attribute_list_generator('totalRevenue',
-                                                   annual_income_statement,
-                                                   years)
-    net_profit_list = single_attribute_list_generator('netIncome',
-                                                      annual_income_statement,
-                                                      years)
-    net_profit_margin = calculate_margins(net_profit_list,
-                                          revenue_list)
-
-    # Free cash flow calculation
-    operating_cash_flow_list = single_attribute_list_generator('operatingCashflow',
-                                                               annual_cash_flow_statement,
-                                                               years)
-    capital_expenditures_list = single_attribute_list_generator('capitalExpenditures',
-                                                                annual_cash_flow_statement,
-                                                                years)
-    free_cash_flow_list = [(operating_cash_flow_list[i] - capital_expenditures_list[i])
-                           for i in range(len(operating_cash_flow_list))]
-    free_cash_flow_margin = calculate_margins(free_cash_flow_list,
-                                              revenue_list)
-    return revenue_list, net_profit_margin, free_cash_flow_margin, years
-
-
-def display_historic_data(rev_list, fcf_mrgn, prft_margin, pe):
-    cagr_rev = []
-    for j in range(1, len(rev_list)):
-        cagr_rev.append("%.1f" % (((rev_list[0]/rev_list[j]) ** (1/j) - 1) * 100) + " %")
-    avg_fcf_margin = []
-    sum_fcf_margin = 0
-    avg_profit_margin = []
-    sum_profit_margin = 0
-    for j in range(len(fcf_mrgn)):
-        sum_fcf_margin += fcf_mrgn[j]
-        avg_fcf_margin.append("%.1f" % (sum_fcf_margin/(j + 1) * 100) + " %")
-        sum_profit_margin += prft_margin[j]
-        avg_profit_margin.append("%.1f" % (sum_profit_margin/(j + 1) * 100) + " %")
-
-    # Print the data in table
+    """Revenue, net profit margin, free cash flow margin and fiscal year of every
+    annual report as arrays, most recent first. Missing values are NaN."""
+    with stats.stage('parse', symbol=stock.symbol):
+        rows = annual_rows(stock)
+        revenue, net_income, operating_cash_flow, capital_expenditures = (
+            np.array([row[field] for _, row in rows], dtype=float)
+            for field in ('totalRevenue', 'netIncome', 'operatingCashflow', 'capitalExpenditures'))
+        years = np.array([fiscal_date[:4] for fiscal_date, _ in rows], dtype='U4')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return revenue, net_income / revenue, (operating_cash_flow - capital_expenditures) / revenue, years
+
+
+def format_percent(fraction) -> str:
+    return "  -   " if np.isnan(fraction) else "%.1f" % (fraction * 100) + " %"
+
+
+def display_historic_data(metrics, pe):
+    """Print revenue growth and average margins over the last 1-5 years
+    from a historical_metrics record"""
+    n_years = min(len(metrics['revenue']), 5)
     headers = ["Rev. Grwth|", "Prft Mrgin|", "FCF Margin|"]
-    content = [cagr_rev, avg_profit_margin, avg_fcf_margin]
+    content = [metrics['revenue_cagr'][:n_years - 1],
+               metrics['avg_profit_margin'][:n_years],
+               metrics['avg_fcf_margin'][:n_years]]
     print('*' * 80)
-    print("----------| 1 year | 2 year | 3 year | 4 year | 5 year |")
+    print("----------|" + "".join(" {} year |".format(year) for year in range(1, n_years + 1)))
     for row, header in enumerate(headers):
         print(header, end='')
         for item in content[row]:
-            print(f" {item} ", end='|')
+            print(f" {format_percent(item)} ", end='|')
         print()
     print(f"Current P/E: {pe}")
     print('*' * 80)
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Interactive stock valuation.")
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE',
+                        help="print the time spent in each stage on quit, with a file name "
+                             "also write a JSON lines trace of every event")
+    args = parser.parse_args()
+    if args.profile is not None:
+        stats.enable(trace=bool(args.profile))
     while True:
         apikey, ticker = get_user_input()
         if ticker.casefold() == 'quit':
+            if args.profile is not None:
+                stats.print_report()
+            if args.profile:
+                stats.export_trace(args.profile)
             break
         stock = StockData(ticker, apikey)
-        # stock.trailingTM()
 
-        # Data parsing
-        revenue_list, free_cash_flow_margin, net_profit_margin, years = parse_statements(stock)
-
-        # Arrange and display parsed data
-        display_historic_data(revenue_list,
-                              free_cash_flow_margin,
-                              net_profit_margin,
-                              stock.overview["PERatio"])
+        # Arrange and display historic data
+        try:
+            metrics = historical_metrics.metrics_for_stock(stock)
+            ttm_revenue = stock.trailing_twelve_months()
+        except (ValueError, fx_rates.MissingRates) as error:
+            print(error)
+            continue
+        display_historic_data(metrics, stock.overview["PERatio"])
 
         # Get user assumptions and perform analysis
         [years_of_analysis, rev_growth, profit_margin, fcf_margin, p_e, p_fcf, desired_ror] = get_assumptions()
@@ -220,6 +287,5 @@ if __name__ == "__main__":
                                             p_fcf,
                                             desired_ror)
         shares_outstanding = int(stock.overview["SharesOutstanding"])
-        (intrinsic_fcf_val, intrinsic_profit_val) = valuation_assumptions.evaluate(revenue_list[0],
-                                                                                   shares_outstanding)
+        (intrinsic_fcf_val, intrinsic_profit_val) = valuation_assumptions.evaluate(ttm_revenue, shares_outstanding)
         print_fair_price(intrinsic_fcf_val, intrinsic_profit_val)
@@ -0,0 +1,86 @@
+"""Quota handling of bulk_fetch against a local fixture server that answers
+like Alpha Vantage once the quota is used up. The rate limiter and the server
+share a fake clock, so waiting for the quota takes no real time."""
+import tempfile
+import threading
+import unittest
+import numpy as np
+from bulk_fetch import DailyQuotaExceeded, TokenBucket, iter_fetch
+from data_sources import AlphaVantageSource, save_fixture, serve_fixtures
+from benchmarks.synthetic import synthetic_payloads, ticker_symbols
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+
+class QuotaTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        for symbol in ticker_symbols(10):
+            for function, data in synthetic_payloads(symbol, rng).items():
+                save_fixture(self.directory.name, function, symbol, data)
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def fetch(self, tickers, limiter, max_workers=1):
+        return dict(iter_fetch(tickers, 'test', max_workers=max_workers, limiter=limiter, cache=None,
+                               source=AlphaVantageSource(self.server.url)))
+
+    def test_rejected_requests_wait_for_the_quota_and_retry(self):
+        self.server = serve_fixtures(self.directory.name, calls_per_minute=5, clock=self.clock)
+        # Twice as many calls per minute as the server allows
+        limiter = TokenBucket(10, 60, clock=self.clock, sleep=self.clock.sleep)
+        results = self.fetch(ticker_symbols(4), limiter)
+        self.assertEqual(sorted(results), ticker_symbols(4))
+        for payloads in results.values():
+            self.assertIsInstance(payloads, dict)
+            self.assertIn('annualReports', payloads['INCOME_STATEMENT'])
+        # 12 calls at 5 per minute, each rejection drains the bucket for a full minute
+        self.assertGreaterEqual(self.clock.now, 120)
+
+    def test_daily_quota_stops_the_run(self):
+        self.server = serve_fixtures(self.directory.name, calls_per_day=7, clock=self.clock)
+        limiter = TokenBucket(1000, 60, clock=self.clock, sleep=self.clock.sleep)
+        # One worker, so the 7 allowed calls complete exactly 2 tickers
+        results = self.fetch(ticker_symbols(10), limiter)
+        self.assertEqual(len(results), 10)
+        fetched = [ticker for ticker, payloads in results.items() if isinstance(payloads, dict)]
+        self.assertEqual(len(fetched), 2)
+        for ticker, payloads in results.items():
+            if ticker not in fetched:
+                self.assertIsInstance(payloads, DailyQuotaExceeded)
+        # No waiting for a refill that won't come today
+        self.assertLess(self.clock.now, 60)
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_daily_count_resets_at_the_day_boundary(self):
+        days = ['2024-01-01']
+        clock = FakeClock()
+        limiter = TokenBucket(100, 60, per_day=2, clock=clock, sleep=clock.sleep, today=lambda: days[0])
+        limiter.acquire()
+        limiter.acquire()
+        self.assertRaises(DailyQuotaExceeded, limiter.acquire)
+        days[0] = '2024-01-02'
+        limiter.acquire()
+        self.assertEqual(limiter.used_today, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
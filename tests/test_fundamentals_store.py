@@ -0,0 +1,56 @@
+"""Merging refreshed statements into the store and finding the tickers to refresh"""
+import unittest
+import numpy as np
+from fundamentals_store import FundamentalsStore
+from refresh import changed_tickers
+from stock_valuation import StockData
+
+
+def stock(symbol, revenue_by_date, announced):
+    """StockData with annual reports of the given revenue, the last date is also the latest quarter"""
+    annual = [{'fiscalDateEnding': date, 'totalRevenue': str(revenue), 'netIncome': str(revenue // 10)}
+              for date, revenue in revenue_by_date.items()]
+    cash_flow = [{'fiscalDateEnding': date, 'operatingCashflow': str(revenue // 5),
+                  'capitalExpenditures': str(revenue // 20)} for date, revenue in revenue_by_date.items()]
+    return StockData(symbol, payloads={
+        'INCOME_STATEMENT': {'annualReports': annual, 'quarterlyReports': annual[-1:]},
+        'CASH_FLOW': {'annualReports': cash_flow, 'quarterlyReports': cash_flow[-1:]},
+        'OVERVIEW': {'LatestQuarter': announced, 'SharesOutstanding': '1000'}})
+
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.store = FundamentalsStore.from_stocks([
+            stock('AAA', {'2021-12-31': 100, '2022-12-31': 110}, '2022-12-31'),
+            stock('BBB', {'2021-06-30': 200, '2022-06-30': 220}, '2022-06-30')])
+
+    def test_only_new_quarters_and_new_tickers_are_changed(self):
+        overviews = {'AAA': {'LatestQuarter': '2023-12-31'}, 'BBB': {'LatestQuarter': '2022-06-30'},
+                     'CCC': {'LatestQuarter': '2023-03-31'}}
+        self.assertEqual(changed_tickers(self.store, overviews), ['AAA', 'CCC'])
+
+    def test_merged_reports_replace_and_extend_the_history(self):
+        merged = self.store.merge([stock('AAA', {'2022-12-31': 115, '2023-12-31': 130}, '2023-12-31'),
+                                   stock('CCC', {'2022-03-31': 50}, '2023-03-31')])
+        self.assertEqual(merged.tickers.tolist(), ['AAA', 'BBB', 'CCC'])
+        history = merged.history('AAA')
+        self.assertEqual(history['fiscalDateEnding'].astype(str).tolist(),
+                         ['2023-12-31', '2022-12-31', '2021-12-31'])
+        self.assertEqual(history['totalRevenue'].tolist(), [130, 115, 100])
+        self.assertEqual(merged.history('BBB')['totalRevenue'].tolist(), [220, 200])
+        self.assertEqual(merged.history('CCC')['totalRevenue'].tolist(), [50])
+        self.assertEqual(merged.latest_quarter[merged.index('AAA')], np.datetime64('2023-12-31'))
+        self.assertEqual(merged.latest_quarter[merged.index('BBB')], np.datetime64('2022-06-30'))
+        overviews = {'AAA': {'LatestQuarter': '2023-12-31'}, 'BBB': {'LatestQuarter': '2022-06-30'},
+                     'CCC': {'LatestQuarter': '2023-03-31'}}
+        self.assertEqual(changed_tickers(merged, overviews), [])
+
+    def test_quarter_announced_before_the_statements(self):
+        merged = self.store.merge([stock('AAA', {'2021-12-31': 100, '2022-12-31': 110}, '2023-03-31')])
+        self.assertEqual(merged.latest_quarter[merged.index('AAA')], np.datetime64('2022-12-31'))
+        self.assertEqual(changed_tickers(merged, {'AAA': {'LatestQuarter': '2023-03-31'}}), [])
+        self.assertEqual(changed_tickers(merged, {'AAA': {'LatestQuarter': '2023-06-30'}}), ['AAA'])
+
+
+if __name__ == "__main__":
+    unittest.main()
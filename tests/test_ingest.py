@@ -0,0 +1,62 @@
+"""Streaming statements into gzip JSON lines files and reading them back"""
+import gzip
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from data_sources import ReplaySource, fixture_path, save_fixture
+from ingest import ingest, iter_stocks, records_path
+from stock_valuation import STATEMENTS, StockData
+from benchmarks.synthetic import synthetic_payloads, ticker_symbols
+
+
+class IngestTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fixtures = os.path.join(self.directory.name, 'fixtures')
+        self.records = os.path.join(self.directory.name, 'records')
+        rng = np.random.default_rng(0)
+        self.payloads = {symbol: synthetic_payloads(symbol, rng) for symbol in ticker_symbols(3)}
+        for symbol, payloads in self.payloads.items():
+            for function, data in payloads.items():
+                save_fixture(self.fixtures, function, symbol, data)
+        # Pretty-printed responses hold newlines, a record has to stay on one line
+        symbol = ticker_symbols(3)[1]
+        with open(fixture_path(self.fixtures, 'OVERVIEW', symbol), 'w') as fixture_file:
+            json.dump(self.payloads[symbol]['OVERVIEW'], fixture_file, indent=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def ingest(self, tickers):
+        return dict(ingest(tickers, 'test', self.records, max_workers=2, source=ReplaySource(self.fixtures)))
+
+    def test_statements_are_read_back(self):
+        results = self.ingest(ticker_symbols(3))
+        self.assertTrue(all(isinstance(size, int) and size > 0 for size in results.values()))
+        for function in STATEMENTS:
+            with gzip.open(records_path(self.records, function), 'rt') as records_file:
+                self.assertEqual(len(records_file.readlines()), 3)
+        stocks = {stock.symbol: stock for stock in iter_stocks(self.records)}
+        self.assertEqual(sorted(stocks), ticker_symbols(3))
+        for symbol, stock in stocks.items():
+            payloads = self.payloads[symbol]
+            self.assertEqual(stock.overview['LatestQuarter'], payloads['OVERVIEW']['LatestQuarter'])
+            self.assertEqual(stock.income_statement['annualReports'][0]['totalRevenue'],
+                             payloads['INCOME_STATEMENT']['annualReports'][0]['totalRevenue'])
+            self.assertEqual(len(stock.cash_flow['quarterlyReports']),
+                             len(payloads['CASH_FLOW']['quarterlyReports']))
+            # Fields the valuation doesn't use aren't decoded
+            self.assertNotIn('ebitda', stock.income_statement['annualReports'][0])
+            self.assertEqual(stock.trailing_twelve_months(),
+                             StockData(symbol, payloads=payloads).trailing_twelve_months())
+
+    def test_unknown_tickers_fail_and_leave_no_record(self):
+        results = self.ingest(ticker_symbols(2) + ['UNKNOWN'])
+        self.assertIsInstance(results['UNKNOWN'], ValueError)
+        self.assertEqual(sorted(stock.symbol for stock in iter_stocks(self.records)), ticker_symbols(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
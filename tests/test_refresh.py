@@ -0,0 +1,63 @@
+"""Incremental refresh of a stored universe from saved responses"""
+import tempfile
+import unittest
+import numpy as np
+from data_sources import ReplaySource, save_fixture
+from fundamentals_store import FundamentalsStore
+from refresh import refresh
+from stock_valuation import StockData
+from benchmarks.synthetic import synthetic_payloads, ticker_symbols
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.payloads = {symbol: synthetic_payloads(symbol, rng) for symbol in ticker_symbols(3)}
+        for symbol, payloads in self.payloads.items():
+            for function, data in payloads.items():
+                save_fixture(self.directory.name, function, symbol, data)
+        self.store = FundamentalsStore.from_stocks(StockData(symbol, payloads=payloads)
+                                                   for symbol, payloads in self.payloads.items())
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def announce(self, symbol, quarter):
+        save_fixture(self.directory.name, 'OVERVIEW', symbol,
+                     dict(self.payloads[symbol]['OVERVIEW'], LatestQuarter=quarter))
+
+    def refresh(self):
+        self.store, refreshed, failed = refresh(self.store, 'test', source=ReplaySource(self.directory.name),
+                                                cache=None, max_workers=1)
+        self.assertEqual(failed, {})
+        return refreshed
+
+    def test_unchanged_tickers_are_not_fetched(self):
+        self.assertEqual(self.refresh(), [])
+
+    def test_quarter_announced_before_the_statements_is_fetched_once(self):
+        symbol = ticker_symbols(3)[1]
+        statements_quarter = self.store.latest_quarter[self.store.index(symbol)]
+        announced = str(statements_quarter + np.timedelta64(90, 'D'))
+        self.announce(symbol, announced)
+        self.assertEqual(self.refresh(), [symbol])
+        # The statements still end at the old quarter
+        self.assertEqual(self.store.latest_quarter[self.store.index(symbol)], statements_quarter)
+        self.assertEqual(self.store.announced_quarter[self.store.index(symbol)], np.datetime64(announced))
+        self.assertEqual(self.refresh(), [])
+        self.announce(symbol, str(statements_quarter + np.timedelta64(181, 'D')))
+        self.assertEqual(self.refresh(), [symbol])
+
+    def test_announced_quarter_is_saved(self):
+        symbol = ticker_symbols(3)[0]
+        self.announce(symbol, '2030-03-31')
+        self.refresh()
+        with tempfile.TemporaryDirectory() as store_directory:
+            self.store.save(store_directory)
+            self.store = FundamentalsStore.load(store_directory, mmap=False)
+            self.assertEqual(self.refresh(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""Disk response cache: persisted LRU order and batched eviction"""
+import tempfile
+import unittest
+from unittest import mock
+import response_cache
+from response_cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        clock = mock.patch('response_cache.time.time', side_effect=range(1000, 100000))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def cache(self, **options):
+        return ResponseCache(self.directory.name, **options)
+
+    def test_hits_are_saved_on_close(self):
+        cache = self.cache()
+        cache.put('OVERVIEW', 'A', {'Symbol': 'A'})
+        cache.put('OVERVIEW', 'B', {'Symbol': 'B'})
+        cache.get('OVERVIEW', 'A')
+        cache.close()
+        reloaded = self.cache()
+        self.assertGreater(reloaded.index['OVERVIEW_A'][1], reloaded.index['OVERVIEW_B'][1])
+
+    def test_hits_are_saved_periodically(self):
+        cache = self.cache()
+        cache.put('OVERVIEW', 'A', {'Symbol': 'A'})
+        for _ in range(response_cache.SAVE_EVERY_HITS):
+            cache.get('OVERVIEW', 'A')
+        stored_at, last_used = self.cache().index['OVERVIEW_A']
+        self.assertGreater(last_used, stored_at)
+
+    def test_eviction_removes_the_least_recently_used_down_to_the_low_water_mark(self):
+        cache = self.cache(max_entries=10)
+        for symbol in 'ABCDEFGHIJ':
+            cache.put('OVERVIEW', symbol, {'Symbol': symbol})
+        cache.get('OVERVIEW', 'A')
+        cache.put('OVERVIEW', 'K', {'Symbol': 'K'})
+        self.assertEqual(len(cache.index), 9)
+        self.assertEqual(sorted(key[-1] for key in cache.index), list('ADEFGHIJK'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+"""Incremental updates of the sensitivity grid"""
+import unittest
+import numpy as np
+from sensitivity import SensitivityGrid
+from stock_valuation import Assumptions
+
+ASSUMPTIONS = Assumptions(10, 8, 20, 18, 20, 25, 10)
+
+
+def grid(rows, columns):
+    return SensitivityGrid(ASSUMPTIONS, 5.7e10, 9e8, 'rev_growth', rows, 'desired_ror', columns)
+
+
+class SensitivityGridTest(unittest.TestCase):
+    def assertSameGrid(self, updated, rows, columns):
+        full = grid(rows, columns)
+        np.testing.assert_allclose(updated.fcf, full.fcf, rtol=1e-12)
+        np.testing.assert_allclose(updated.profit, full.profit, rtol=1e-12)
+
+    def test_shifted_rows_are_kept(self):
+        rows, columns = np.arange(0, 21) * 0.5, np.arange(16, 25) * 0.5
+        updated = grid(rows, columns)
+        shifted = np.arange(4, 30) * 0.5
+        np.testing.assert_array_equal(updated.set_row_values(shifted), np.arange(17, 26))
+        self.assertSameGrid(updated, shifted, columns)
+
+    def test_changed_columns_are_recomputed(self):
+        rows, columns = np.arange(0, 21) * 0.5, np.arange(16, 25) * 0.5
+        updated = grid(rows, columns)
+        changed = columns.copy()
+        changed[3] += 0.25
+        np.testing.assert_array_equal(updated.set_column_values(changed), [3])
+        self.assertSameGrid(updated, rows, changed)
+        np.testing.assert_array_equal(updated.set_column_values(changed[2:]), [])
+        self.assertSameGrid(updated, rows, changed[2:])
+
+
+if __name__ == "__main__":
+    unittest.main()
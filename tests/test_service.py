@@ -0,0 +1,54 @@
+"""Local valuation service answering from saved responses"""
+import json
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+import numpy as np
+from data_sources import ReplaySource, save_fixture
+from instrumentation import stats
+from service import ValuationService, serve
+from benchmarks.synthetic import synthetic_payloads
+
+
+class ServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for function, data in synthetic_payloads('BRK.B', np.random.default_rng(0)).items():
+            save_fixture(self.directory.name, function, 'BRK.B', data)
+        self.service = ValuationService('test', source=ReplaySource(self.directory.name), cache=None)
+        self.server = serve(self.service, port=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        self.directory.cleanup()
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.server.url + path) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            return error.code, json.load(error)
+
+    def test_symbol_is_unquoted_and_the_query_ignored(self):
+        status, data = self.get('/stock/brk%2Eb?fields=all')
+        self.assertEqual(status, 200)
+        self.assertEqual(data['symbol'], 'BRK.B')
+
+    def test_invalid_symbols_are_rejected(self):
+        for path in ('/stock/BRK%2FB', '/stock/../../x', '/stock/', '/stock/ABCDEFGHIJK', '/stock/A%00'):
+            status, data = self.get(path)
+            self.assertEqual(status, 400, path)
+            self.assertIn('Invalid ticker symbol', data['error'])
+
+    def test_closed_services_leave_the_stats(self):
+        other = ValuationService('test', source=ReplaySource(self.directory.name), cache=None)
+        self.assertIs(stats._caches['fundamentals'], other.fundamentals)
+        other.close()
+        self.assertNotIn('fundamentals', stats._caches)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+"""Closed-form discounted value against the year by year model"""
+import unittest
+import numpy as np
+from stock_valuation import discounted_value
+
+
+def year_by_year(yrs, growth, prft_margin, fcf_mrgn, pe, pfcf, ror, revenue, shares):
+    """Discount each year's cash flow and earnings, plus the terminal value"""
+    intrinsic_fcf = intrinsic_profit = 0.0
+    for year in range(1, yrs + 1):
+        discounted_revenue = revenue * (1 + growth) ** year / (1 + ror) ** year
+        intrinsic_fcf += discounted_revenue * fcf_mrgn
+        intrinsic_profit += discounted_revenue * prft_margin
+    terminal_revenue = revenue * (1 + growth) ** yrs / (1 + ror) ** yrs
+    intrinsic_fcf += terminal_revenue * fcf_mrgn * pfcf
+    intrinsic_profit += terminal_revenue * prft_margin * pe
+    return intrinsic_fcf / shares, intrinsic_profit / shares
+
+
+class DiscountedValueTest(unittest.TestCase):
+    def assertMatchesLoop(self, yrs, growth, ror):
+        arguments = (yrs, growth, 0.2, 0.15, 20, 25, ror, 5.7e10, 9e8)
+        for closed_form, loop in zip(discounted_value(*arguments), year_by_year(*arguments)):
+            self.assertAlmostEqual(closed_form / loop, 1, delta=1e-12)
+
+    def test_growth_above_and_below_the_rate_of_return(self):
+        for yrs in (1, 5, 10, 20):
+            for growth, ror in ((0.12, 0.08), (0.03, 0.1), (0, 0.09)):
+                self.assertMatchesLoop(yrs, growth, ror)
+
+    def test_growth_equal_to_the_rate_of_return(self):
+        for yrs in (1, 10):
+            self.assertMatchesLoop(yrs, 0.1, 0.1)
+
+    def test_growth_close_to_the_rate_of_return(self):
+        for difference in (1e-6, 1e-10, -1e-13):
+            self.assertMatchesLoop(10, 0.1 + difference, 0.1)
+
+    def test_negative_growth(self):
+        for growth in (-0.05, -0.3):
+            self.assertMatchesLoop(10, growth, 0.1)
+
+    def test_arrays_are_broadcast(self):
+        growth = np.array([-0.05, 0.1, 0.15])
+        fcf, profit = discounted_value(10, growth, 0.2, 0.15, 20, 25, 0.1, 5.7e10, 9e8)
+        for index, value in enumerate(growth.tolist()):
+            loop_fcf, loop_profit = year_by_year(10, value, 0.2, 0.15, 20, 25, 0.1, 5.7e10, 9e8)
+            self.assertAlmostEqual(fcf[index] / loop_fcf, 1, delta=1e-12)
+            self.assertAlmostEqual(profit[index] / loop_profit, 1, delta=1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()